@@ -1,31 +1,384 @@
-from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Form
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Form, Depends, Query, Header, BackgroundTasks
+from fastapi.responses import FileResponse, ORJSONResponse, PlainTextResponse, Response, StreamingResponse
 from dotenv import load_dotenv
+from starlette.background import BackgroundTask
 from starlette.middleware.cors import CORSMiddleware
+from starlette.routing import Match
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import re
+import json
+import orjson
+import base64
+import contextlib
+import contextvars
+import csv
+import hashlib
 import logging
+import math
+import tempfile
+import threading
+import unicodedata
 from pathlib import Path
-from pydantic import BaseModel, Field, validator
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, ValidationError, validator
+from pymongo import ASCENDING, IndexModel, ReturnDocument, UpdateOne, monitoring
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from typing import List, Optional, Dict, Any, Generic, TypeVar, Union
 import uuid
-from datetime import datetime
+import time
+import asyncio
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from datetime import datetime, timedelta
 from enum import Enum
 import openpyxl
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+from openpyxl.styles import Font, PatternFill, Alignment
+import xlsxwriter
 from io import BytesIO
+import numpy as np
 import pandas as pd
 
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet import/export is optional
+    pq = None
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
+# MongoDB connection. The pool is per process: with N uvicorn workers the
+# server sees up to N x MONGO_MAX_POOL_SIZE connections. Multi-class exports
+# and export jobs read with MONGO_REPORT_READ_PREFERENCE, so on a replica set
+# they can be served by secondaries, at most MONGO_REPORT_MAX_STALENESS_SECONDS
+# behind. Responses with an ETag and cached files always read the primary:
+# they are keyed by the primary's data versions and must not hold older data.
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+MONGO_CLIENT_OPTIONS = {
+    "maxPoolSize": int(os.environ.get('MONGO_MAX_POOL_SIZE', '50')),
+    "minPoolSize": int(os.environ.get('MONGO_MIN_POOL_SIZE', '5')),
+    "maxIdleTimeMS": int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', '300000')),
+    "waitQueueTimeoutMS": int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', '5000')),
+    "serverSelectionTimeoutMS": int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000')),
+    "connectTimeoutMS": int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', '5000')),
+    "socketTimeoutMS": int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', '60000')),
+    "compressors": os.environ.get('MONGO_COMPRESSORS', 'zlib'),
+    "appname": os.environ.get('MONGO_APP_NAME', 'penilaian-guru')
+}
+MONGO_REPORT_READ_PREFERENCE = os.environ.get('MONGO_REPORT_READ_PREFERENCE', 'secondaryPreferred')
+MONGO_REPORT_MAX_STALENESS_SECONDS = int(os.environ.get('MONGO_REPORT_MAX_STALENESS_SECONDS', '90'))
+READ_PREFERENCES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest
+}
+
+def report_read_preference():
+    mode = READ_PREFERENCES[MONGO_REPORT_READ_PREFERENCE]
+    return mode() if mode is Primary else mode(max_staleness=MONGO_REPORT_MAX_STALENESS_SECONDS)
+
+class ConnectionPoolMonitor(monitoring.ConnectionPoolListener):
+    """Counts connections and checkout waits per server.
+    
+    Events arrive on the driver's executor threads. A checkout starts and
+    finishes on the same thread, so the wait is timed with a thread local.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.servers = {}
+    
+    def server(self, address):
+        key = f"{address[0]}:{address[1]}"
+        if key not in self.servers:
+            self.servers[key] = {
+                "open": 0, "in_use": 0, "checkouts": 0, "checkout_failures": defaultdict(int),
+                "pool_clears": 0, "wait": {"total": 0.0, "max": 0.0}
+            }
+        return self.servers[key]
+    
+    def record_wait(self, server):
+        started_at = getattr(self.local, "started_at", None)
+        if started_at is None:
+            return
+        self.local.started_at = None
+        seconds = time.perf_counter() - started_at
+        server["wait"]["total"] += seconds
+        server["wait"]["max"] = max(server["wait"]["max"], seconds)
+    
+    def connection_check_out_started(self, event):
+        self.local.started_at = time.perf_counter()
+    
+    def connection_checked_out(self, event):
+        with self.lock:
+            server = self.server(event.address)
+            server["in_use"] += 1
+            server["checkouts"] += 1
+            self.record_wait(server)
+    
+    def connection_check_out_failed(self, event):
+        with self.lock:
+            server = self.server(event.address)
+            server["checkout_failures"][event.reason] += 1
+            self.record_wait(server)
+    
+    def connection_checked_in(self, event):
+        with self.lock:
+            self.server(event.address)["in_use"] -= 1
+    
+    def connection_created(self, event):
+        with self.lock:
+            self.server(event.address)["open"] += 1
+    
+    def connection_closed(self, event):
+        with self.lock:
+            self.server(event.address)["open"] -= 1
+    
+    def pool_cleared(self, event):
+        with self.lock:
+            self.server(event.address)["pool_clears"] += 1
+    
+    def connection_ready(self, event):
+        pass
+    
+    def pool_created(self, event):
+        pass
+    
+    def pool_ready(self, event):
+        pass
+    
+    def pool_closed(self, event):
+        pass
+    
+    def stats(self):
+        with self.lock:
+            servers = {}
+            for key, server in sorted(self.servers.items()):
+                waited = server["checkouts"] + sum(server["checkout_failures"].values())
+                servers[key] = {
+                    "open": server["open"],
+                    "in_use": server["in_use"],
+                    "available": server["open"] - server["in_use"],
+                    "checkouts": server["checkouts"],
+                    "checkout_failures": dict(server["checkout_failures"]),
+                    "pool_clears": server["pool_clears"],
+                    "checkout_wait": {
+                        "total_seconds": round(server["wait"]["total"], 4),
+                        "avg_seconds": round(server["wait"]["total"] / waited, 4) if waited else 0.0,
+                        "max_seconds": round(server["wait"]["max"], 4)
+                    }
+                }
+        return {
+            "process_id": os.getpid(),
+            "max_pool_size": MONGO_CLIENT_OPTIONS["maxPoolSize"],
+            "min_pool_size": MONGO_CLIENT_OPTIONS["minPoolSize"],
+            "wait_queue_timeout_ms": MONGO_CLIENT_OPTIONS["waitQueueTimeoutMS"],
+            "report_read_preference": MONGO_REPORT_READ_PREFERENCE,
+            "servers": servers
+        }
+
+pool_monitor = ConnectionPoolMonitor()
+
+# Metrics: request latency and database round-trips per route template,
+# exposed in the Prometheus text format on /metrics. Each uvicorn worker keeps
+# its own numbers. Requests slower than SLOW_REQUEST_SECONDS are logged with
+# their query count.
+SLOW_REQUEST_SECONDS = float(os.environ.get('SLOW_REQUEST_SECONDS', '1.0'))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_COMMAND_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in labels.items()) + "}"
+
+def format_value(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Counter (or gauge) keyed by label values; safe to update from driver threads."""
+    def __init__(self, name: str, help: str, label_names=(), kind: str = "counter"):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self.kind = kind
+        self.lock = threading.Lock()
+        self.values = {}
+    
+    def inc(self, labels=(), amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+    
+    def set(self, labels=(), value=0):
+        with self.lock:
+            self.values[labels] = value
+    
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            for labels, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{format_labels(dict(zip(self.label_names, labels)))} {format_value(value)}")
+        return lines
+
+class Histogram:
+    """Histogram with cumulative buckets keyed by label values."""
+    def __init__(self, name: str, help: str, label_names, buckets):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.series = {}
+    
+    def observe(self, labels, value):
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+    
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for labels, series in sorted(self.series.items()):
+                base = dict(zip(self.label_names, labels))
+                for bound, count in zip(self.buckets, series["buckets"]):
+                    lines.append(f"{self.name}_bucket{format_labels({**base, 'le': format_value(bound)})} {count}")
+                lines.append(f"{self.name}_bucket{format_labels({**base, 'le': '+Inf'})} {series['count']}")
+                lines.append(f"{self.name}_sum{format_labels(base)} {format_value(series['sum'])}")
+                lines.append(f"{self.name}_count{format_labels(base)} {series['count']}")
+        return lines
+
+http_requests = Counter(
+    "http_requests_total", "HTTP requests by route template and status.", ("method", "route", "status")
+)
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "Time until the response starts, by route template.",
+    ("method", "route"), LATENCY_BUCKETS
+)
+http_request_db_commands = Histogram(
+    "http_request_db_commands", "MongoDB round-trips per request, by route template.",
+    ("method", "route"), DB_COMMAND_BUCKETS
+)
+http_request_db_duration = Histogram(
+    "http_request_db_duration_seconds", "Time spent in MongoDB per request, by route template.",
+    ("method", "route"), LATENCY_BUCKETS
+)
+mongodb_commands = Counter("mongodb_commands_total", "MongoDB commands by name.", ("command",))
+mongodb_command_failures = Counter("mongodb_command_failures_total", "Failed MongoDB commands by name.", ("command",))
+mongodb_command_duration = Counter(
+    "mongodb_command_duration_seconds_total", "Time spent in MongoDB commands by name.", ("command",)
+)
+
+class RequestDbStats:
+    """Round-trips of one request. Queries run in parallel with gather may
+    report from several driver threads at once."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.commands = 0
+        self.seconds = 0.0
+    
+    def record(self, seconds: float):
+        with self.lock:
+            self.commands += 1
+            self.seconds += seconds
+
+# Set by the metrics middleware; Motor copies the context into its executor
+# threads, so the command listener sees the stats of the request it serves.
+request_db_stats = contextvars.ContextVar("request_db_stats", default=None)
+
+class CommandMetrics(monitoring.CommandListener):
+    """Counts every MongoDB command, globally and for the current request."""
+    def started(self, event):
+        pass
+    
+    def succeeded(self, event):
+        self.record(event)
+    
+    def failed(self, event):
+        mongodb_command_failures.inc((event.command_name,))
+        self.record(event)
+    
+    def record(self, event):
+        seconds = event.duration_micros / 1_000_000
+        mongodb_commands.inc((event.command_name,))
+        mongodb_command_duration.inc((event.command_name,), seconds)
+        stats = request_db_stats.get()
+        if stats is not None:
+            stats.record(seconds)
+
+command_metrics = CommandMetrics()
+
+class LazyDatabase:
+    """The Motor database, resolved once the client is opened on startup.
+    
+    Handlers keep using db.students and friends; the client itself is created
+    in the lifespan handler so it binds to the server's event loop.
+    """
+    def __init__(self, read_preference=None):
+        self.read_preference = read_preference
+        self.database = None
+    
+    def bind(self, client):
+        read_preference = self.read_preference() if self.read_preference is not None else None
+        self.database = client.get_database(os.environ['DB_NAME'], read_preference=read_preference)
+    
+    def unbind(self):
+        self.database = None
+    
+    def __getattr__(self, name):
+        return getattr(self.bound(), name)
+    
+    def __getitem__(self, name):
+        return self.bound()[name]
+    
+    def bound(self):
+        if self.database is None:
+            raise RuntimeError("Koneksi database belum dibuka")
+        return self.database
+
+client = None
+db = LazyDatabase()
+report_db = LazyDatabase(read_preference=report_read_preference)
+
+def open_database():
+    global client
+    client = AsyncIOMotorClient(mongo_url, event_listeners=[pool_monitor, command_metrics], **MONGO_CLIENT_OPTIONS)
+    db.bind(client)
+    report_db.bind(client)
+
+def close_database():
+    global client
+    db.unbind()
+    report_db.unbind()
+    client.close()
+    client = None
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    open_database()
+    workbook_pool.start()
+    try:
+        await create_db_indexes()
+        await start_job_workers()
+        await start_reference_cache_watch()
+        yield
+    finally:
+        await stop_background_tasks()
+        close_database()
 
 # Create the main app without a prefix
-app = FastAPI(title="Aplikasi Penilaian Guru", version="1.0.0")
+app = FastAPI(title="Aplikasi Penilaian Guru", version="1.0.0", lifespan=lifespan)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -72,6 +425,16 @@ class StudentUpdate(BaseModel):
     jenis_kelamin: Optional[GenderEnum] = None
     status: Optional[StatusEnum] = None
 
+    # Updates are stored as given and read back without a model, so they are
+    # normalized here the same way Student normalizes new students
+    @validator('nama')
+    def validate_nama(cls, v):
+        return v.strip().title() if v is not None else v
+    
+    @validator('nis', 'kelas')
+    def validate_nis_kelas(cls, v):
+        return v.strip().upper() if v is not None else v
+
 class Subject(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     nama_mata_pelajaran: str = Field(..., min_length=1)
@@ -85,6 +448,10 @@ class Subject(BaseModel):
 class SubjectCreate(BaseModel):
     nama_mata_pelajaran: str = Field(..., min_length=1)
 
+    @validator('nama_mata_pelajaran')
+    def validate_nama_mata_pelajaran(cls, v):
+        return v.strip().title()
+
 class LearningObjective(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     tujuan_pembelajaran: str = Field(..., min_length=1)
@@ -98,6 +465,10 @@ class LearningObjective(BaseModel):
 class LearningObjectiveCreate(BaseModel):
     tujuan_pembelajaran: str = Field(..., min_length=1)
 
+    @validator('tujuan_pembelajaran')
+    def validate_tujuan_pembelajaran(cls, v):
+        return v.strip()
+
 class SubjectClassObjective(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     subject_id: str
@@ -131,18 +502,643 @@ class GradeCreate(BaseModel):
 class GradeUpdate(BaseModel):
     nilai: float = Field(..., ge=0, le=100)
 
+class GradeSheetRow(BaseModel):
+    student_id: str = Field(..., min_length=1)
+    nilai: float = Field(..., ge=0, le=100)
+
+class GradeSheetCreate(BaseModel):
+    subject_id: str
+    kelas: str
+    learning_objective_id: str
+    # Rows are validated one by one so a bad row does not reject the sheet
+    grades: List[Dict[str, Any]]
+
+T = TypeVar("T")
+
+class Page(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
+
+# Index declarations, built idempotently at startup
+INDEXES = {
+    "students": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("nis", ASCENDING)], name="nis_unique", unique=True),
+        IndexModel([("kelas", ASCENDING), ("nama", ASCENDING)], name="kelas_nama"),
+        IndexModel([("nama", ASCENDING), ("id", ASCENDING)], name="nama_id"),
+        IndexModel([("search_tokens", ASCENDING)], name="search_tokens"),
+    ],
+    "subjects": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("nama_mata_pelajaran", ASCENDING)], name="nama_mata_pelajaran_unique", unique=True),
+        IndexModel([("nama_mata_pelajaran", ASCENDING), ("id", ASCENDING)], name="nama_mata_pelajaran_id"),
+    ],
+    "learning_objectives": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("tujuan_pembelajaran", ASCENDING), ("id", ASCENDING)], name="tujuan_pembelajaran_id"),
+    ],
+    "subject_class_objectives": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("subject_id", ASCENDING), ("kelas", ASCENDING)], name="subject_kelas_unique", unique=True),
+        IndexModel([("kelas", ASCENDING), ("id", ASCENDING)], name="kelas_id"),
+        IndexModel([("learning_objective_ids", ASCENDING)], name="learning_objective_ids"),
+    ],
+    "grades": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel(
+            [("student_id", ASCENDING), ("subject_id", ASCENDING), ("kelas", ASCENDING), ("learning_objective_id", ASCENDING)],
+            name="student_subject_kelas_objective_unique",
+            unique=True
+        ),
+        IndexModel(
+            [("kelas", ASCENDING), ("subject_id", ASCENDING), ("learning_objective_id", ASCENDING)],
+            name="kelas_subject_objective"
+        ),
+        IndexModel([("subject_id", ASCENDING)], name="subject_id"),
+        IndexModel([("learning_objective_id", ASCENDING)], name="learning_objective_id"),
+    ],
+    "grade_summaries": [
+        IndexModel([("kelas", ASCENDING), ("student_id", ASCENDING)], name="kelas_student_unique", unique=True),
+        IndexModel([("student_id", ASCENDING)], name="student_id"),
+    ],
+    "class_grade_summaries": [
+        IndexModel([("kelas", ASCENDING)], name="kelas_unique", unique=True),
+    ],
+    "jobs": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)], name="status_created_at"),
+        IndexModel([("type", ASCENDING), ("status", ASCENDING)], name="type_status"),
+    ],
+}
+
+def _index_signature(key, unique):
+    return [(field, int(direction)) for field, direction in key], bool(unique)
+
+async def ensure_indexes():
+    """Build missing declared indexes and report drift from the declarations."""
+    report = {}
+    for collection_name, models in INDEXES.items():
+        collection = db[collection_name]
+        existing = await collection.index_information()
+        declared = {model.document["name"]: model for model in models}
+        
+        collection_report = {"created": [], "drifted": [], "failed": [], "undeclared": []}
+        for name, model in declared.items():
+            spec = model.document
+            if name in existing:
+                current = existing[name]
+                if _index_signature(current["key"], current.get("unique")) != _index_signature(spec["key"].items(), spec.get("unique")):
+                    collection_report["drifted"].append(name)
+                continue
+            
+            # Build one at a time so a unique index blocked by duplicate data does not stop the rest
+            try:
+                await collection.create_indexes([model])
+                collection_report["created"].append(name)
+            except OperationFailure as e:
+                collection_report["failed"].append(f"{name}: {e}")
+        
+        collection_report["undeclared"] = [name for name in existing if name != "_id_" and name not in declared]
+        report[collection_name] = collection_report
+    return report
+
+# Student search: names are stored as lowercase, diacritic-folded word
+# prefixes in `search_tokens` so that searches are served by a multikey index
+SEARCH_TOKEN_MAX_LENGTH = 20
+
+def normalize_search_text(text: str) -> List[str]:
+    folded = unicodedata.normalize("NFKD", text)
+    folded = "".join(char for char in folded if not unicodedata.combining(char))
+    return [word[:SEARCH_TOKEN_MAX_LENGTH] for word in re.findall(r"\w+", folded.lower())]
+
+def student_search_tokens(nama: str) -> List[str]:
+    tokens = set()
+    for word in normalize_search_text(nama):
+        tokens.update(word[:length] for length in range(1, len(word) + 1))
+    return sorted(tokens)
+
+def student_search_query(search: str):
+    clauses = [{"nis": {"$regex": "^" + re.escape(search.strip().upper())}}]
+    words = normalize_search_text(search)
+    if words:
+        clauses.append({"search_tokens": {"$all": words}})
+    return {"$or": clauses}
+
+def student_search_rank(student, search: str) -> int:
+    """Lower is better: exact NIS, NIS prefix, whole-word name match, name prefix."""
+    nis = search.strip().upper()
+    if student["nis"] == nis:
+        return 0
+    if student["nis"].startswith(nis):
+        return 1
+    name_words = set(normalize_search_text(student["nama"]))
+    if all(word in name_words for word in normalize_search_text(search)):
+        return 2
+    return 3
+
+async def backfill_student_search_tokens():
+    operations = [
+        UpdateOne({"id": student["id"]}, {"$set": {"search_tokens": student_search_tokens(student["nama"])}})
+        async for student in db.students.find({"search_tokens": {"$exists": False}}, {"_id": 0, "id": 1, "nama": 1})
+    ]
+    if operations:
+        await db.students.bulk_write(operations, ordered=False)
+    return len(operations)
+
+# Reference data cache: subjects, learning objectives and SCO mappings change
+# rarely, so lookups go through a TTL + LRU cache. Every write handler of those
+# collections invalidates it; with REFERENCE_CACHE_CHANGE_STREAMS=true a change
+# stream also invalidates it for writes made by other workers. Entries also
+# remember the data version they were loaded at and are only served while
+# that version is current, so a write made by another worker is seen at once.
+CACHE_MISS = object()
+REFERENCE_COLLECTIONS = ("subjects", "learning_objectives", "subject_class_objectives")
+
+class TTLCache:
+    """Size-bounded LRU cache whose entries expire `ttl` seconds after being set.
+    
+    Keys are tuples whose first item is a namespace, so related entries can be
+    invalidated together.
+    """
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key, default=CACHE_MISS, min_version=None):
+        """Return the entry unless it expired or was set at a version below `min_version`."""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic() and (min_version is None or entry[2] >= min_version):
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        if entry is not None:
+            del self._entries[key]
+        self.misses += 1
+        return default
+    
+    def set(self, key, value, version=0):
+        self._entries[key] = (time.monotonic() + self.ttl, value, version)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+    
+    def invalidate(self, namespace: str, *key):
+        if key:
+            self._entries.pop((namespace, *key), None)
+            return
+        for cached_key in [cached_key for cached_key in self._entries if cached_key[0] == namespace]:
+            del self._entries[cached_key]
+    
+    def clear(self):
+        self._entries.clear()
+    
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0
+        }
+
+reference_cache = TTLCache(
+    maxsize=int(os.environ.get('REFERENCE_CACHE_MAX_ENTRIES', '10000')),
+    ttl=float(os.environ.get('REFERENCE_CACHE_TTL_SECONDS', '300'))
+)
+
+async def watch_reference_changes():
+    """Invalidate the reference cache on writes from any worker (needs a replica set)."""
+    pipeline = [{"$match": {"ns.coll": {"$in": list(REFERENCE_COLLECTIONS)}}}]
+    try:
+        async with db.watch(pipeline) as stream:
+            async for change in stream:
+                reference_cache.invalidate(change["ns"]["coll"])
+    except OperationFailure as e:
+        logger.warning(f"Change stream cache tidak aktif: {e}")
+
+# Data versions: one counter per collection, bumped by every handler that
+# writes to it. GET responses carry an ETag derived from the counters their
+# data depends on, so unchanged data is answered with 304 before any query runs.
+# Grade, student and SCO writes also bump a per-class counter (class_version_key)
+# which keys the cached export files of that class.
+def class_version_key(kelas: str) -> str:
+    return f"class:{kelas.upper()}"
+
+async def bump_data_versions(*names):
+    await db.data_versions.bulk_write([
+        UpdateOne({"_id": name}, {"$inc": {"version": 1}}, upsert=True)
+        for name in names
+    ], ordered=False)
+
+async def bump_all_class_versions(classes):
+    # Classes never written since versioning began have no counter yet, so
+    # the given ones are upserted rather than only incremented where present
+    keys = sorted({class_version_key(kelas) for kelas in classes if kelas})
+    if keys:
+        await bump_data_versions(*keys)
+    await db.data_versions.update_many(
+        {"_id": {"$regex": "^class:", "$nin": keys}}, {"$inc": {"version": 1}}
+    )
+
+# Versions read by conditional_get for the current request. Cached data is
+# served only when it is at least as new as these, so a response never
+# carries an ETag newer than its body.
+request_versions = contextvars.ContextVar("request_versions", default=None)
+
+async def current_version(name: str) -> int:
+    versions = request_versions.get()
+    if versions is not None and name in versions:
+        return versions[name]
+    return (await get_data_versions([name]))[name]
+
+async def get_data_versions(collection_names):
+    documents = await db.data_versions.find({"_id": {"$in": list(collection_names)}}).to_list(None)
+    versions = {document["_id"]: document["version"] for document in documents}
+    return {name: versions.get(name, 0) for name in collection_names}
+
+DASHBOARD_DEPENDENCIES = ("students", "subjects", "learning_objectives", "subject_class_objectives", "grades", "grade_summaries")
+
+# GET routes answered conditionally, with the collections their responses read
+ETAG_ROUTES = [
+    (re.compile(r"^/api/students/classes/list$"), ("students",)),
+    (re.compile(r"^/api/students(/[^/]+)?$"), ("students",)),
+    (re.compile(r"^/api/subjects$"), ("subjects",)),
+    (re.compile(r"^/api/learning-objectives$"), ("learning_objectives",)),
+    (re.compile(r"^/api/subject-class-objectives$"), ("subject_class_objectives", "subjects", "learning_objectives")),
+    (re.compile(r"^/api/grades/objectives/[^/]+/[^/]+$"), ("subject_class_objectives", "learning_objectives")),
+    (re.compile(r"^/api/grades/[^/]+/[^/]+/[^/]+$"), ("students", "grades")),
+    (
+        re.compile(r"^/api/reports/grades/[^/]+(/matrix)?$"),
+        ("students", "subject_class_objectives", "subjects", "learning_objectives", "grades")
+    ),
+    (re.compile(r"^/api/reports/averages/[^/]+$"), ("grade_summaries",)),
+    (re.compile(r"^/api/dashboard/summary$"), DASHBOARD_DEPENDENCIES),
+]
+
+def etag_dependencies(path: str):
+    for pattern, collection_names in ETAG_ROUTES:
+        if pattern.match(path):
+            return collection_names
+    return None
+
+def compute_etag(path: str, query: str, versions) -> str:
+    version_key = ",".join(f"{name}:{version}" for name, version in sorted(versions.items()))
+    return '"' + hashlib.sha1(f"{path}?{query}|{version_key}".encode()).hexdigest() + '"'
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
 # Helper functions
 async def get_student_by_nis(nis: str):
     student = await db.students.find_one({"nis": nis.upper()})
     return student
 
 async def get_subject_class_objective(subject_id: str, kelas: str):
-    sco = await db.subject_class_objectives.find_one({
-        "subject_id": subject_id,
-        "kelas": kelas.upper()
-    })
+    cache_key = ("subject_class_objectives", "pair", subject_id, kelas.upper())
+    version = await current_version("subject_class_objectives")
+    sco = reference_cache.get(cache_key, min_version=version)
+    if sco is CACHE_MISS:
+        sco = await db.subject_class_objectives.find_one({
+            "subject_id": subject_id,
+            "kelas": kelas.upper()
+        }, {"_id": 0})
+        reference_cache.set(cache_key, sco, version)
     return sco
 
+async def get_subject_class_objectives_for_classes(kelas_list: Optional[List[str]] = None):
+    """SCOs of the given classes (all when None), served from the reference cache."""
+    classes = tuple(sorted({kelas.upper() for kelas in kelas_list})) if kelas_list is not None else None
+    cache_key = ("subject_class_objectives", "classes", classes)
+    version = await current_version("subject_class_objectives")
+    scos = reference_cache.get(cache_key, min_version=version)
+    if scos is CACHE_MISS:
+        class_filter = {"kelas": {"$in": list(classes)}} if classes is not None else {}
+        scos = await db.subject_class_objectives.find(class_filter, {"_id": 0}).to_list(None)
+        reference_cache.set(cache_key, scos, version)
+    return scos
+
+async def get_documents_by_ids(collection, ids):
+    """Fetch documents by their `id` field with one $in query, keyed by id.
+    
+    Reference collections are served from the reference cache first and
+    only the missing ids are queried.
+    """
+    unique_ids = set(ids)
+    cached = collection.name in REFERENCE_COLLECTIONS
+    
+    documents_by_id = {}
+    if cached:
+        version = await current_version(collection.name)
+        for document_id in unique_ids:
+            document = reference_cache.get((collection.name, document_id), min_version=version)
+            if document is not CACHE_MISS:
+                documents_by_id[document_id] = document
+    
+    missing_ids = list(unique_ids - set(documents_by_id))
+    if missing_ids:
+        documents = await collection.find({"id": {"$in": missing_ids}}, {"_id": 0}).to_list(None)
+        for document in documents:
+            documents_by_id[document["id"]] = document
+            if cached:
+                reference_cache.set((collection.name, document["id"]), document, version)
+    return documents_by_id
+
+# List pagination: keyset pages ordered by (sort field, id) behind an opaque cursor
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+LEGACY_LIST_LIMIT = 1000
+NDJSON_BATCH_SIZE = 500
+LIST_PROJECTION = {"_id": 0, "search_tokens": 0}
+
+class ListParams:
+    """Query parameters shared by the list endpoints.
+    
+    Without `cursor` or `limit` the endpoints keep returning a plain list,
+    or the first Page when there are more than LEGACY_LIST_LIMIT documents;
+    with either they return a Page, and `stream=true` streams every
+    document as NDJSON.
+    """
+    def __init__(
+        self,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+        include_total: bool = False,
+        stream: bool = False
+    ):
+        self.cursor = cursor
+        self.limit = limit
+        self.include_total = include_total
+        self.stream = stream
+    
+    @property
+    def paginated(self) -> bool:
+        return self.cursor is not None or self.limit is not None
+
+def encode_cursor(sort_value, document_id: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([sort_value, document_id]).encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        sort_value, document_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor tidak valid")
+    return sort_value, document_id
+
+# List reads skip the Pydantic models: documents were validated when they were
+# written, the query already projects out _id, and ORJSONResponse serializes
+# the raw dicts (including datetimes) directly. response_model stays on the
+# routes for the API schema only, since a returned Response is not re-validated.
+async def raw_items(documents):
+    return documents
+
+def ndjson_response(cursor, to_items) -> StreamingResponse:
+    async def generate():
+        batch = []
+        async for document in cursor:
+            batch.append(document)
+            if len(batch) >= NDJSON_BATCH_SIZE:
+                for item in await to_items(batch):
+                    yield orjson.dumps(item) + b"\n"
+                batch = []
+        for item in await to_items(batch):
+            yield orjson.dumps(item) + b"\n"
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+def lean_response(content) -> Response:
+    # NDJSON streams are already responses
+    if isinstance(content, Response):
+        return content
+    return ORJSONResponse(content)
+
+async def list_documents(collection, query, sort_field: str, params: ListParams, to_items):
+    sort = [(sort_field, ASCENDING), ("id", ASCENDING)]
+    if params.stream:
+        return ndjson_response(collection.find(query, LIST_PROJECTION).sort(sort), to_items)
+    if not params.paginated:
+        documents = await collection.find(query, LIST_PROJECTION).sort(sort).to_list(LEGACY_LIST_LIMIT + 1)
+        if len(documents) <= LEGACY_LIST_LIMIT:
+            return await to_items(documents)
+        # Too many for a plain list: answer with the first page instead of
+        # silently cutting it off, so the caller can follow next_cursor
+        documents = documents[:LEGACY_LIST_LIMIT]
+        return {
+            "items": await to_items(documents),
+            "next_cursor": encode_cursor(documents[-1][sort_field], documents[-1]["id"])
+        }
+    
+    limit = params.limit or DEFAULT_PAGE_SIZE
+    page_query = query
+    if params.cursor:
+        sort_value, last_id = decode_cursor(params.cursor)
+        page_query = {"$and": [query, {"$or": [
+            {sort_field: {"$gt": sort_value}},
+            {sort_field: sort_value, "id": {"$gt": last_id}}
+        ]}]}
+    
+    # Fetch one extra document to know whether another page exists
+    documents = await collection.find(page_query, LIST_PROJECTION).sort(sort).limit(limit + 1).to_list(None)
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        next_cursor = encode_cursor(documents[-1][sort_field], documents[-1]["id"])
+    
+    page = {"items": await to_items(documents), "next_cursor": next_cursor}
+    if params.include_total:
+        page["total"] = await collection.count_documents(query)
+    return page
+
+# Grade summaries: running totals and counts of configured grades per
+# (kelas, student) in grade_summaries and per kelas in class_grade_summaries.
+# Writes keep them up to date with $inc deltas, grade sheets by recomputing
+# the students they touched and their class; rebuild_grade_summaries
+# recomputes them from the grades collection to repair any drift.
+def grade_average(summary) -> float:
+    if not summary or summary["count"] <= 0:
+        return 0
+    return round(summary["total"] / summary["count"], 2)
+
+def mean_grade(values) -> float:
+    # fsum makes the result independent of column order, so the class report
+    # and the grade matrix (ordered differently) round to the same value
+    return round(math.fsum(values) / len(values), 2)
+
+async def is_objective_configured(subject_id: str, kelas: str, objective_id: str) -> bool:
+    sco = await db.subject_class_objectives.find_one(
+        {"subject_id": subject_id, "kelas": kelas, "learning_objective_ids": objective_id},
+        {"_id": 1}
+    )
+    return sco is not None
+
+async def apply_grade_summary_deltas(deltas):
+    """Apply {(kelas, student_id): (total, count)} increments to both summary collections."""
+    student_operations = []
+    class_deltas = defaultdict(lambda: [0, 0])
+    for (kelas, student_id), (total, count) in deltas.items():
+        if not total and not count:
+            continue
+        student_operations.append(UpdateOne(
+            {"kelas": kelas, "student_id": student_id},
+            {"$inc": {"total": total, "count": count}},
+            upsert=True
+        ))
+        class_deltas[kelas][0] += total
+        class_deltas[kelas][1] += count
+    
+    if not student_operations:
+        return
+    await db.grade_summaries.bulk_write(student_operations, ordered=False)
+    await db.class_grade_summaries.bulk_write([
+        UpdateOne({"kelas": kelas}, {"$inc": {"total": total, "count": count}}, upsert=True)
+        for kelas, (total, count) in class_deltas.items()
+    ], ordered=False)
+
+async def get_grade_contributions(scos, student_ids: Optional[List[str]] = None):
+    """Sum the grades covered by the given SCOs per (kelas, student_id), for all
+    students or only the given ones."""
+    clauses = [
+        {"subject_id": sco["subject_id"], "kelas": sco["kelas"], "learning_objective_id": {"$in": sco["learning_objective_ids"]}}
+        for sco in scos
+        if sco["learning_objective_ids"]
+    ]
+    if not clauses:
+        return {}
+    
+    pipeline = [
+        {"$match": {
+            "$or": clauses,
+            **({"student_id": {"$in": student_ids}} if student_ids is not None else {}),
+            **await hidden_grades_filter()
+        }},
+        {"$group": {
+            "_id": {"kelas": "$kelas", "student_id": "$student_id"},
+            "total": {"$sum": "$nilai"},
+            "count": {"$sum": 1}
+        }}
+    ]
+    contributions = {}
+    async for row in db.grades.aggregate(pipeline):
+        contributions[(row["_id"]["kelas"], row["_id"]["student_id"])] = (row["total"], row["count"])
+    return contributions
+
+async def replace_student_grade_summaries(kelas: str, student_ids: List[str]):
+    """Recompute the summaries of some students of a class from their grades,
+    then the class summary from its student summaries.
+    
+    Values are set rather than incremented, so concurrent writers of the same
+    students never count a grade twice.
+    """
+    scos = await get_subject_class_objectives_for_classes([kelas])
+    contributions = await get_grade_contributions(scos, student_ids)
+    operations = []
+    for student_id in student_ids:
+        total, count = contributions.get((kelas, student_id), (0, 0))
+        operations.append(UpdateOne(
+            {"kelas": kelas, "student_id": student_id},
+            {"$set": {"total": total, "count": count}},
+            upsert=True
+        ))
+    try:
+        await db.grade_summaries.bulk_write(operations, ordered=False)
+    except BulkWriteError:
+        # A concurrent writer created some summaries first; they exist now
+        await db.grade_summaries.bulk_write(operations, ordered=False)
+    
+    pipeline = [
+        {"$match": {"kelas": kelas}},
+        {"$group": {"_id": None, "total": {"$sum": "$total"}, "count": {"$sum": "$count"}}}
+    ]
+    rows = await db.grade_summaries.aggregate(pipeline).to_list(None)
+    total, count = (rows[0]["total"], rows[0]["count"]) if rows else (0, 0)
+    await db.class_grade_summaries.update_one({"kelas": kelas}, {"$set": {"total": total, "count": count}}, upsert=True)
+
+def subtract_grade_contributions(added, removed):
+    deltas = dict(added)
+    for key, (total, count) in removed.items():
+        added_total, added_count = deltas.get(key, (0, 0))
+        deltas[key] = (added_total - total, added_count - count)
+    return deltas
+
+async def remove_student_grade_summaries(student_id: str):
+    summaries = await db.grade_summaries.find({"student_id": student_id}).to_list(None)
+    await db.grade_summaries.delete_many({"student_id": student_id})
+    if summaries:
+        await db.class_grade_summaries.bulk_write([
+            UpdateOne({"kelas": summary["kelas"]}, {"$inc": {"total": -summary["total"], "count": -summary["count"]}})
+            for summary in summaries
+        ], ordered=False)
+
+async def rebuild_grade_summaries():
+    """Recompute both summary collections from the grades and SCO configuration."""
+    configured = set()
+    async for sco in db.subject_class_objectives.find({}, {"_id": 0, "subject_id": 1, "kelas": 1, "learning_objective_ids": 1}):
+        for obj_id in sco["learning_objective_ids"]:
+            configured.add((sco["subject_id"], sco["kelas"], obj_id))
+    
+    totals = defaultdict(lambda: [0, 0])
+    grade_fields = {"_id": 0, "student_id": 1, "subject_id": 1, "kelas": 1, "learning_objective_id": 1, "nilai": 1}
+    async for grade in db.grades.find(await hidden_grades_filter(), grade_fields):
+        if (grade["subject_id"], grade["kelas"], grade["learning_objective_id"]) in configured:
+            student_totals = totals[(grade["kelas"], grade["student_id"])]
+            student_totals[0] += grade["nilai"]
+            student_totals[1] += 1
+    
+    class_totals = defaultdict(lambda: [0, 0])
+    for (kelas, _), (total, count) in totals.items():
+        class_totals[kelas][0] += total
+        class_totals[kelas][1] += count
+    
+    await db.grade_summaries.delete_many({})
+    await db.class_grade_summaries.delete_many({})
+    if totals:
+        await db.grade_summaries.insert_many([
+            {"kelas": kelas, "student_id": student_id, "total": total, "count": count}
+            for (kelas, student_id), (total, count) in totals.items()
+        ])
+        await db.class_grade_summaries.insert_many([
+            {"kelas": kelas, "total": total, "count": count}
+            for kelas, (total, count) in class_totals.items()
+        ])
+    return {"student_count": len(totals), "class_count": len(class_totals)}
+
+# Cascading deletes: the parent document is removed at once and a
+# grade_cleanup job is queued for its grades. Until that job completes, the
+# grades it covers are excluded from every read by hidden_grades_filter();
+# the job then deletes them in throttled batches.
+GRADE_CLEANUP_BATCH_SIZE = int(os.environ.get('GRADE_CLEANUP_BATCH_SIZE', '1000'))
+GRADE_CLEANUP_PAUSE_SECONDS = float(os.environ.get('GRADE_CLEANUP_PAUSE_SECONDS', '0.1'))
+
+def grade_cleanup_filter(params):
+    # Only grades that existed when the parent was deleted are covered
+    query = {"created_at": {"$lte": params["before"]}}
+    if params["field"]:
+        query[params["field"]] = params["value"]
+    return query
+
+async def schedule_grade_cleanup(field: Optional[str] = None, value: Optional[str] = None):
+    """Queue removal of the grades where `field` equals `value` (all grades when None)."""
+    return await submit_job("grade_cleanup", {"field": field, "value": value, "before": datetime.utcnow()})
+
+async def hidden_grades_filter():
+    """Query clause excluding the grades of cleanups that have not completed yet."""
+    cleanups = await db.jobs.find(
+        {"type": "grade_cleanup", "status": {"$ne": JobStatusEnum.COMPLETED.value}},
+        {"_id": 0, "params": 1}
+    ).to_list(None)
+    if not cleanups:
+        return {}
+    return {"$nor": [grade_cleanup_filter(job["params"]) for job in cleanups]}
+
 # Student Management Endpoints
 @api_router.post("/students", response_model=Student)
 async def create_student(student: StudentCreate):
@@ -153,22 +1149,27 @@ async def create_student(student: StudentCreate):
     
     student_dict = student.dict()
     student_obj = Student(**student_dict)
-    await db.students.insert_one(student_obj.dict())
+    try:
+        await db.students.insert_one({**student_obj.dict(), "search_tokens": student_search_tokens(student_obj.nama)})
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail=f"Siswa dengan NIS {student.nis} sudah ada")
+    await bump_data_versions("students", class_version_key(student_obj.kelas))
     return student_obj
 
-@api_router.get("/students", response_model=List[Student])
-async def get_students(search: Optional[str] = None, kelas: Optional[str] = None):
+@api_router.get("/students", response_model=Union[List[Student], Page[Student]])
+async def get_students(search: Optional[str] = None, kelas: Optional[str] = None, params: ListParams = Depends()):
     query = {}
-    if search:
-        query["$or"] = [
-            {"nama": {"$regex": search, "$options": "i"}},
-            {"nis": {"$regex": search, "$options": "i"}}
-        ]
+    if search and search.strip():
+        query.update(student_search_query(search))
     if kelas:
         query["kelas"] = kelas.upper()
     
-    students = await db.students.find(query).sort("nama", 1).to_list(1000)
-    return [Student(**{k: v for k, v in student.items() if k != "_id"}) for student in students]
+    students = await list_documents(db.students, query, "nama", params, raw_items)
+    
+    # Plain search results are ranked; pages and streams keep the (nama, id) order
+    if search and search.strip() and isinstance(students, list):
+        students.sort(key=lambda student: student_search_rank(student, search))
+    return lean_response(students)
 
 @api_router.get("/students/{student_id}", response_model=Student)
 async def get_student(student_id: str):
@@ -191,27 +1192,40 @@ async def update_student(student_id: str, student_update: StudentUpdate):
             if existing_student and existing_student["id"] != student_id:
                 raise HTTPException(status_code=400, detail=f"Siswa dengan NIS {update_data['nis']} sudah ada")
         
+        if "nama" in update_data:
+            update_data["search_tokens"] = student_search_tokens(update_data["nama"])
         update_data["updated_at"] = datetime.utcnow()
-        await db.students.update_one({"id": student_id}, {"$set": update_data})
+        try:
+            await db.students.update_one({"id": student_id}, {"$set": update_data})
+        except DuplicateKeyError:
+            raise HTTPException(status_code=400, detail=f"Siswa dengan NIS {update_data['nis']} sudah ada")
         
     updated_student = await db.students.find_one({"id": student_id})
+    await bump_data_versions("students", class_version_key(student["kelas"]), class_version_key(updated_student["kelas"]))
     return Student(**updated_student)
 
 @api_router.delete("/students/{student_id}")
 async def delete_student(student_id: str):
-    result = await db.students.delete_one({"id": student_id})
-    if result.deleted_count == 0:
+    student = await db.students.find_one_and_delete({"id": student_id})
+    if not student:
         raise HTTPException(status_code=404, detail="Siswa tidak ditemukan")
     
-    # Delete related grades
-    await db.grades.delete_many({"student_id": student_id})
-    return {"message": "Siswa berhasil dihapus"}
+    # Related grades are hidden now and removed in the background
+    cleanup = await schedule_grade_cleanup("student_id", student_id)
+    await remove_student_grade_summaries(student_id)
+    await bump_data_versions("students", "grades", "grade_summaries", class_version_key(student["kelas"]))
+    return {"message": "Siswa berhasil dihapus", "cleanup_job_id": cleanup["id"]}
 
 @api_router.delete("/students")
 async def delete_all_students():
+    classes = await db.students.distinct("kelas")
     await db.students.delete_many({})
-    await db.grades.delete_many({})
-    return {"message": "Semua data siswa berhasil dihapus"}
+    cleanup = await schedule_grade_cleanup()
+    await db.grade_summaries.delete_many({})
+    await db.class_grade_summaries.delete_many({})
+    await bump_data_versions("students", "grades", "grade_summaries")
+    await bump_all_class_versions(classes)
+    return {"message": "Semua data siswa berhasil dihapus", "cleanup_job_id": cleanup["id"]}
 
 @api_router.get("/students/classes/list")
 async def get_classes():
@@ -228,13 +1242,17 @@ async def create_subject(subject: SubjectCreate):
     
     subject_dict = subject.dict()
     subject_obj = Subject(**subject_dict)
-    await db.subjects.insert_one(subject_obj.dict())
+    try:
+        await db.subjects.insert_one(subject_obj.dict())
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail=f"Mata pelajaran {subject.nama_mata_pelajaran} sudah ada")
+    reference_cache.invalidate("subjects", subject_obj.id)
+    await bump_data_versions("subjects")
     return subject_obj
 
-@api_router.get("/subjects", response_model=List[Subject])
-async def get_subjects():
-    subjects = await db.subjects.find().sort("nama_mata_pelajaran", 1).to_list(1000)
-    return [Subject(**{k: v for k, v in subject.items() if k != "_id"}) for subject in subjects]
+@api_router.get("/subjects", response_model=Union[List[Subject], Page[Subject]])
+async def get_subjects(params: ListParams = Depends()):
+    return lean_response(await list_documents(db.subjects, {}, "nama_mata_pelajaran", params, raw_items))
 
 @api_router.put("/subjects/{subject_id}", response_model=Subject)
 async def update_subject(subject_id: str, subject_update: SubjectCreate):
@@ -244,7 +1262,7 @@ async def update_subject(subject_id: str, subject_update: SubjectCreate):
     
     # Check for duplicate subject name
     existing_subject = await db.subjects.find_one({
-        "nama_mata_pelajaran": subject_update.nama_mata_pelajaran.strip().title(),
+        "nama_mata_pelajaran": subject_update.nama_mata_pelajaran,
         "id": {"$ne": subject_id}
     })
     if existing_subject:
@@ -252,9 +1270,14 @@ async def update_subject(subject_id: str, subject_update: SubjectCreate):
     
     update_data = subject_update.dict()
     update_data["updated_at"] = datetime.utcnow()
-    await db.subjects.update_one({"id": subject_id}, {"$set": update_data})
+    try:
+        await db.subjects.update_one({"id": subject_id}, {"$set": update_data})
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail=f"Mata pelajaran {subject_update.nama_mata_pelajaran} sudah ada")
+    reference_cache.invalidate("subjects", subject_id)
     
     updated_subject = await db.subjects.find_one({"id": subject_id})
+    await bump_data_versions("subjects")
     return Subject(**updated_subject)
 
 @api_router.delete("/subjects/{subject_id}")
@@ -264,9 +1287,15 @@ async def delete_subject(subject_id: str):
         raise HTTPException(status_code=404, detail="Mata pelajaran tidak ditemukan")
     
     # Delete related data
+    scos = await db.subject_class_objectives.find({"subject_id": subject_id}).to_list(None)
+    removed = await get_grade_contributions(scos)
     await db.subject_class_objectives.delete_many({"subject_id": subject_id})
-    await db.grades.delete_many({"subject_id": subject_id})
-    return {"message": "Mata pelajaran berhasil dihapus"}
+    reference_cache.invalidate("subjects", subject_id)
+    reference_cache.invalidate("subject_class_objectives")
+    cleanup = await schedule_grade_cleanup("subject_id", subject_id)
+    await apply_grade_summary_deltas(subtract_grade_contributions({}, removed))
+    await bump_data_versions("subjects", "subject_class_objectives", "grades", "grade_summaries")
+    return {"message": "Mata pelajaran berhasil dihapus", "cleanup_job_id": cleanup["id"]}
 
 # Learning Objective Management Endpoints
 @api_router.post("/learning-objectives", response_model=LearningObjective)
@@ -274,12 +1303,13 @@ async def create_learning_objective(objective: LearningObjectiveCreate):
     objective_dict = objective.dict()
     objective_obj = LearningObjective(**objective_dict)
     await db.learning_objectives.insert_one(objective_obj.dict())
+    reference_cache.invalidate("learning_objectives", objective_obj.id)
+    await bump_data_versions("learning_objectives")
     return objective_obj
 
-@api_router.get("/learning-objectives", response_model=List[LearningObjective])
-async def get_learning_objectives():
-    objectives = await db.learning_objectives.find().sort("tujuan_pembelajaran", 1).to_list(1000)
-    return [LearningObjective(**{k: v for k, v in objective.items() if k != "_id"}) for objective in objectives]
+@api_router.get("/learning-objectives", response_model=Union[List[LearningObjective], Page[LearningObjective]])
+async def get_learning_objectives(params: ListParams = Depends()):
+    return lean_response(await list_documents(db.learning_objectives, {}, "tujuan_pembelajaran", params, raw_items))
 
 @api_router.put("/learning-objectives/{objective_id}", response_model=LearningObjective)
 async def update_learning_objective(objective_id: str, objective_update: LearningObjectiveCreate):
@@ -290,8 +1320,10 @@ async def update_learning_objective(objective_id: str, objective_update: Learnin
     update_data = objective_update.dict()
     update_data["updated_at"] = datetime.utcnow()
     await db.learning_objectives.update_one({"id": objective_id}, {"$set": update_data})
+    reference_cache.invalidate("learning_objectives", objective_id)
     
     updated_objective = await db.learning_objectives.find_one({"id": objective_id})
+    await bump_data_versions("learning_objectives")
     return LearningObjective(**updated_objective)
 
 @api_router.delete("/learning-objectives/{objective_id}")
@@ -301,9 +1333,15 @@ async def delete_learning_objective(objective_id: str):
         raise HTTPException(status_code=404, detail="Tujuan pembelajaran tidak ditemukan")
     
     # Delete related data
+    scos = await db.subject_class_objectives.find({"learning_objective_ids": objective_id}).to_list(None)
+    removed = await get_grade_contributions(scos)
     await db.subject_class_objectives.delete_many({"learning_objective_ids": objective_id})
-    await db.grades.delete_many({"learning_objective_id": objective_id})
-    return {"message": "Tujuan pembelajaran berhasil dihapus"}
+    reference_cache.invalidate("learning_objectives", objective_id)
+    reference_cache.invalidate("subject_class_objectives")
+    cleanup = await schedule_grade_cleanup("learning_objective_id", objective_id)
+    await apply_grade_summary_deltas(subtract_grade_contributions({}, removed))
+    await bump_data_versions("learning_objectives", "subject_class_objectives", "grades", "grade_summaries")
+    return {"message": "Tujuan pembelajaran berhasil dihapus", "cleanup_job_id": cleanup["id"]}
 
 # Subject Class Objective Management
 @api_router.post("/subject-class-objectives", response_model=SubjectClassObjective)
@@ -316,33 +1354,36 @@ async def create_subject_class_objective(sco: SubjectClassObjectiveCreate):
     sco_dict = sco.dict()
     sco_dict["kelas"] = sco.kelas.upper()
     sco_obj = SubjectClassObjective(**sco_dict)
-    await db.subject_class_objectives.insert_one(sco_obj.dict())
+    try:
+        await db.subject_class_objectives.insert_one(sco_obj.dict())
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Konfigurasi mata pelajaran untuk kelas ini sudah ada")
+    reference_cache.invalidate("subject_class_objectives")
+    
+    # Grades entered before the configuration now count towards the averages
+    await apply_grade_summary_deltas(await get_grade_contributions([sco_obj.dict()]))
+    await bump_data_versions("subject_class_objectives", "grade_summaries", class_version_key(sco_obj.kelas))
     return sco_obj
 
 @api_router.get("/subject-class-objectives")
-async def get_subject_class_objectives():
-    scos = await db.subject_class_objectives.find().to_list(1000)
-    result = []
+async def get_subject_class_objectives(params: ListParams = Depends()):
+    return await list_documents(db.subject_class_objectives, {}, "kelas", params, resolve_subject_class_objectives)
+
+async def resolve_subject_class_objectives(scos):
+    # Resolve every referenced subject and objective with one query per collection
+    subjects = await get_documents_by_ids(db.subjects, [sco["subject_id"] for sco in scos])
+    objectives_by_id = await get_documents_by_ids(
+        db.learning_objectives,
+        [obj_id for sco in scos for obj_id in sco["learning_objective_ids"]]
+    )
     
+    result = []
     for sco in scos:
-        # Get subject info
-        subject = await db.subjects.find_one({"id": sco["subject_id"]})
-        
-        # Get learning objectives info
-        objectives = []
-        for obj_id in sco["learning_objective_ids"]:
-            obj = await db.learning_objectives.find_one({"id": obj_id})
-            if obj:
-                # Remove MongoDB _id field to prevent serialization issues
-                obj_clean = {k: v for k, v in obj.items() if k != "_id"}
-                objectives.append(obj_clean)
-        
-        # Clean subject data
-        subject_clean = {k: v for k, v in subject.items() if k != "_id"} if subject else None
+        objectives = [objectives_by_id[obj_id] for obj_id in sco["learning_objective_ids"] if obj_id in objectives_by_id]
         
         result.append({
             "id": sco["id"],
-            "subject": subject_clean,
+            "subject": subjects.get(sco["subject_id"]),
             "kelas": sco["kelas"],
             "learning_objectives": objectives,
             "created_at": sco["created_at"]
@@ -368,15 +1409,32 @@ async def update_subject_class_objective(sco_id: str, sco_update: SubjectClassOb
     update_data = sco_update.dict()
     update_data["kelas"] = sco_update.kelas.upper()
     update_data["updated_at"] = datetime.utcnow()
-    await db.subject_class_objectives.update_one({"id": sco_id}, {"$set": update_data})
+    try:
+        await db.subject_class_objectives.update_one({"id": sco_id}, {"$set": update_data})
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Konfigurasi mata pelajaran untuk kelas ini sudah ada")
+    reference_cache.invalidate("subject_class_objectives")
+    
+    added = await get_grade_contributions([update_data])
+    removed = await get_grade_contributions([sco])
+    await apply_grade_summary_deltas(subtract_grade_contributions(added, removed))
+    await bump_data_versions(
+        "subject_class_objectives", "grade_summaries",
+        class_version_key(sco["kelas"]), class_version_key(update_data["kelas"])
+    )
     
     return {"message": "Konfigurasi berhasil diperbarui"}
 
 @api_router.delete("/subject-class-objectives/{sco_id}")
 async def delete_subject_class_objective(sco_id: str):
-    result = await db.subject_class_objectives.delete_one({"id": sco_id})
-    if result.deleted_count == 0:
+    sco = await db.subject_class_objectives.find_one_and_delete({"id": sco_id})
+    if not sco:
         raise HTTPException(status_code=404, detail="Konfigurasi tidak ditemukan")
+    reference_cache.invalidate("subject_class_objectives")
+    
+    removed = await get_grade_contributions([sco])
+    await apply_grade_summary_deltas(subtract_grade_contributions({}, removed))
+    await bump_data_versions("subject_class_objectives", "grade_summaries", class_version_key(sco["kelas"]))
     
     return {"message": "Konfigurasi berhasil dihapus"}
 
@@ -387,73 +1445,245 @@ async def get_objectives_by_subject_class(subject_id: str, kelas: str):
     if not sco:
         return []
     
-    objectives = []
-    for obj_id in sco["learning_objective_ids"]:
-        obj = await db.learning_objectives.find_one({"id": obj_id})
-        if obj:
-            # Remove MongoDB _id field to prevent serialization issues
-            obj_clean = {k: v for k, v in obj.items() if k != "_id"}
-            objectives.append(LearningObjective(**obj_clean))
-    
-    return objectives
+    objectives_by_id = await get_documents_by_ids(db.learning_objectives, sco["learning_objective_ids"])
+    return [
+        LearningObjective(**objectives_by_id[obj_id])
+        for obj_id in sco["learning_objective_ids"]
+        if obj_id in objectives_by_id
+    ]
+
+# Fields shown by the grade-input grid, used by the compact sheet mode
+GRADE_SHEET_STUDENT_FIELDS = {"_id": 0, "id": 1, "nama": 1, "nis": 1}
+GRADE_SHEET_GRADE_FIELDS = {"_id": 0, "id": 1, "student_id": 1, "nilai": 1}
 
 @api_router.get("/grades/{subject_id}/{kelas}/{objective_id}")
-async def get_grades_by_criteria(subject_id: str, kelas: str, objective_id: str):
+async def get_grades_by_criteria(subject_id: str, kelas: str, objective_id: str, compact: bool = False):
     # Get students in the class
-    students = await db.students.find({"kelas": kelas.upper()}).sort("nama", 1).to_list(1000)
+    student_projection = GRADE_SHEET_STUDENT_FIELDS if compact else {"_id": 0}
+    students = await db.students.find({"kelas": kelas.upper()}, student_projection).sort("nama", 1).to_list(1000)
+    
+    # Get every grade of the sheet in one query and index it by student
+    grade_projection = GRADE_SHEET_GRADE_FIELDS if compact else {"_id": 0}
+    grades = await db.grades.find({
+        "subject_id": subject_id,
+        "kelas": kelas.upper(),
+        "learning_objective_id": objective_id,
+        **await hidden_grades_filter()
+    }, grade_projection).to_list(None)
+    
+    grades_by_student = {}
+    for grade in grades:
+        grades_by_student.setdefault(grade["student_id"], grade)
     
     result = []
     for student in students:
-        # Get grade for this student and objective
-        grade = await db.grades.find_one({
-            "student_id": student["id"],
-            "subject_id": subject_id,
-            "kelas": kelas.upper(),
-            "learning_objective_id": objective_id
-        })
-        
-        # Clean student data
-        student_clean = {k: v for k, v in student.items() if k != "_id"}
-        grade_clean = {k: v for k, v in grade.items() if k != "_id"} if grade else None
-        
-        result.append({
-            "student": Student(**student_clean),
-            "grade": Grade(**grade_clean) if grade_clean else None
-        })
+        grade = grades_by_student.get(student["id"])
+        if compact:
+            result.append({"student": student, "grade": grade})
+        else:
+            result.append({
+                "student": Student(**student),
+                "grade": Grade(**grade) if grade else None
+            })
     
     return result
 
 @api_router.post("/grades", response_model=Grade)
 async def create_or_update_grade(grade_data: GradeCreate):
-    # Check if grade already exists
-    existing_grade = await db.grades.find_one({
+    now = datetime.utcnow()
+    criteria = {
         "student_id": grade_data.student_id,
         "subject_id": grade_data.subject_id,
         "kelas": grade_data.kelas.upper(),
         "learning_objective_id": grade_data.learning_objective_id
-    })
+    }
+    update_data = {"nilai": grade_data.nilai, "updated_at": now}
+    grade_id = str(uuid.uuid4())
     
-    if existing_grade:
-        # Update existing grade
-        update_data = {"nilai": grade_data.nilai, "updated_at": datetime.utcnow()}
-        await db.grades.update_one({"id": existing_grade["id"]}, {"$set": update_data})
-        updated_grade = await db.grades.find_one({"id": existing_grade["id"]})
-        return Grade(**updated_grade)
-    else:
-        # Create new grade
-        grade_dict = grade_data.dict()
-        grade_dict["kelas"] = grade_data.kelas.upper()
-        grade_obj = Grade(**grade_dict)
-        await db.grades.insert_one(grade_obj.dict())
-        return grade_obj
+    # Upsert in one step; the unique grade index rules out duplicate rows
+    try:
+        previous = await db.grades.find_one_and_update(
+            criteria,
+            {"$set": update_data, "$setOnInsert": {"id": grade_id, "created_at": now}},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        )
+    except DuplicateKeyError:
+        # A concurrent request inserted the same grade first, so update it instead
+        previous = await db.grades.find_one_and_update(
+            criteria,
+            {"$set": update_data},
+            return_document=ReturnDocument.BEFORE
+        )
+    
+    if await is_objective_configured(grade_data.subject_id, criteria["kelas"], grade_data.learning_objective_id):
+        delta = (grade_data.nilai - previous["nilai"], 0) if previous else (grade_data.nilai, 1)
+        await apply_grade_summary_deltas({(criteria["kelas"], grade_data.student_id): delta})
+    await bump_data_versions("grades", "grade_summaries", class_version_key(criteria["kelas"]))
+    
+    if previous:
+        return Grade(**{**previous, **update_data})
+    return Grade(id=grade_id, created_at=now, **criteria, **update_data)
+
+@api_router.post("/grades/bulk")
+async def bulk_upsert_grades(sheet: GradeSheetCreate, background_tasks: BackgroundTasks, warm_export: bool = False):
+    kelas = sheet.kelas.upper()
+    now = datetime.utcnow()
+    
+    results = [None] * len(sheet.grades)
+    operations = []
+    operation_rows = []
+    
+    for index, row in enumerate(sheet.grades):
+        try:
+            grade_row = GradeSheetRow(**row)
+        except ValidationError as e:
+            results[index] = {
+                "student_id": row.get("student_id"),
+                "status": "error",
+                "error": "; ".join(error["msg"] for error in e.errors())
+            }
+            continue
+        
+        operations.append(UpdateOne(
+            {
+                "student_id": grade_row.student_id,
+                "subject_id": sheet.subject_id,
+                "kelas": kelas,
+                "learning_objective_id": sheet.learning_objective_id
+            },
+            {
+                "$set": {"nilai": grade_row.nilai, "updated_at": now},
+                "$setOnInsert": {"id": str(uuid.uuid4()), "created_at": now}
+            },
+            upsert=True
+        ))
+        operation_rows.append((index, grade_row))
+    
+    # Apply the whole sheet in a single ordered round-trip
+    upserted = {}
+    failed_at = len(operations)
+    write_error = None
+    if operations:
+        try:
+            write_result = await db.grades.bulk_write(operations, ordered=True)
+            upserted = write_result.upserted_ids
+        except BulkWriteError as e:
+            upserted = {item["index"]: item["_id"] for item in e.details.get("upserted", [])}
+            failed_at = e.details["writeErrors"][0]["index"]
+            write_error = e.details["writeErrors"][0]["errmsg"]
+    
+    for op_index, (index, grade_row) in enumerate(operation_rows):
+        row_result = {"student_id": grade_row.student_id, "nilai": grade_row.nilai}
+        if op_index < failed_at:
+            row_result["status"] = "created" if op_index in upserted else "updated"
+        elif op_index == failed_at:
+            row_result.update({"status": "error", "error": write_error})
+        else:
+            row_result.update({"status": "error", "error": "Tidak diproses karena baris sebelumnya gagal"})
+        results[index] = row_result
+    
+    # Recompute the written students' summaries from the grades themselves; a
+    # delta from values read before the write would double count when the
+    # same sheet is saved twice at once
+    written = list({grade_row.student_id: None for _, grade_row in operation_rows[:failed_at]})
+    if written and await is_objective_configured(sheet.subject_id, kelas, sheet.learning_objective_id):
+        await replace_student_grade_summaries(kelas, written)
+    if operations:
+        await bump_data_versions("grades", "grade_summaries", class_version_key(kelas))
+        if warm_export:
+            # Pre-render the class export so the next download is served from disk
+            background_tasks.add_task(warm_export_cache, [kelas])
+    
+    error_count = sum(1 for row_result in results if row_result["status"] == "error")
+    return {
+        "message": "Nilai berhasil disimpan" if error_count == 0 else "Sebagian nilai gagal disimpan",
+        "saved_count": len(results) - error_count,
+        "error_count": error_count,
+        "results": results
+    }
 
 @api_router.get("/reports/grades/{kelas}")
 async def get_class_grade_report(kelas: str):
-    # Get all students in class
-    students = await db.students.find({"kelas": kelas.upper()}).sort("nama", 1).to_list(1000)
+    reports = await load_class_grade_reports([kelas])
+    return reports.get(kelas.upper(), [])
+
+async def load_class_report_inputs(kelas_list: Optional[List[str]] = None, database=None):
+    """Load what the reports of several classes (all when None) need in one bulk pass.
+    
+    Students and grades are read from `database`, the primary by default;
+    reference data always comes from the primary through the reference cache.
+    Returns the subjects and objectives by id, and a dict of kelas to
+    (students, scos, grades) for classes that have students.
+    """
+    database = db if database is None else database
+    class_filter = {"kelas": {"$in": [kelas.upper() for kelas in kelas_list]}} if kelas_list is not None else {}
+    
+    # Get all students and subject-class-objectives of the classes
+    students = await database.students.find(class_filter).sort("nama", 1).to_list(None)
+    scos = await get_subject_class_objectives_for_classes(kelas_list)
+    
+    # Resolve subjects, objectives and grades with one query per collection
+    subjects = await get_documents_by_ids(db.subjects, [sco["subject_id"] for sco in scos])
+    objectives = await get_documents_by_ids(
+        db.learning_objectives,
+        [obj_id for sco in scos for obj_id in sco["learning_objective_ids"]]
+    )
+    grades = await database.grades.find({
+        **class_filter,
+        "subject_id": {"$in": list(subjects)},
+        "learning_objective_id": {"$in": list(objectives)},
+        **await hidden_grades_filter()
+    }, GRADE_MATRIX_FIELDS).to_list(None)
+    
+    students_by_class = defaultdict(list)
+    for student in students:
+        students_by_class[student["kelas"]].append(student)
+    scos_by_class = defaultdict(list)
+    for sco in scos:
+        scos_by_class[sco["kelas"]].append(sco)
+    grades_by_class = defaultdict(list)
+    for grade in grades:
+        grades_by_class[grade["kelas"]].append(grade)
+    
+    classes = {
+        kelas: (students_by_class[kelas], scos_by_class[kelas], grades_by_class[kelas])
+        for kelas in sorted(students_by_class)
+    }
+    return subjects, objectives, classes
+
+async def load_class_grade_reports(kelas_list: Optional[List[str]] = None):
+    """Build the grade reports of several classes (all when None) in one bulk pass.
+    
+    Returns a dict of kelas to report rows, for classes that have students.
+    """
+    subjects, objectives, classes = await load_class_report_inputs(kelas_list)
+    return {
+        kelas: build_class_grade_report(students, scos, subjects, objectives, grades)
+        for kelas, (students, scos, grades) in classes.items()
+    }
+
+def build_class_grade_report(students, scos, subjects, objectives, grades):
+    """Join pre-fetched report data in memory into the class report rows.
     
-    # Get all subject-class-objectives for this class
-    scos = await db.subject_class_objectives.find({"kelas": kelas.upper()}).to_list(1000)
+    `subjects` and `objectives` map ids to documents, as returned by
+    get_documents_by_ids.
+    """
+    subject_names = {subject_id: subject["nama_mata_pelajaran"] for subject_id, subject in subjects.items()}
+    objective_names = {obj_id: objective["tujuan_pembelajaran"] for obj_id, objective in objectives.items()}
+    
+    # Keep the first grade per key, matching what find_one would have returned
+    grade_map = {}
+    for grade in grades:
+        key = (grade["student_id"], grade["subject_id"], grade["learning_objective_id"])
+        grade_map.setdefault(key, grade["nilai"])
+    
+    # Report columns are the same for every student in the class
+    columns = []
+    for sco in scos:
+        subject_name = subject_names.get(sco["subject_id"], "")
+        for obj_id in sco["learning_objective_ids"]:
+            columns.append((sco["subject_id"], obj_id, subject_name, objective_names.get(obj_id, "")))
     
     result = []
     for student in students:
@@ -466,48 +1696,292 @@ async def get_class_grade_report(kelas: str):
             "average": 0
         }
         
-        total_grades = 0
-        grade_count = 0
+        graded = []
         
-        for sco in scos:
-            # Get subject info
-            subject = await db.subjects.find_one({"id": sco["subject_id"]})
+        for subject_id, obj_id, subject_name, objective_name in columns:
+            nilai = grade_map.get((student["id"], subject_id, obj_id))
             
-            for obj_id in sco["learning_objective_ids"]:
-                # Get objective info
-                objective = await db.learning_objectives.find_one({"id": obj_id})
-                
-                # Get grade
-                grade = await db.grades.find_one({
-                    "student_id": student["id"],
-                    "subject_id": sco["subject_id"],
-                    "kelas": kelas.upper(),
-                    "learning_objective_id": obj_id
-                })
-                
-                grade_info = {
-                    "subject": subject["nama_mata_pelajaran"] if subject else "",
-                    "objective": objective["tujuan_pembelajaran"] if objective else "",
-                    "nilai": grade["nilai"] if grade else None
-                }
-                
-                student_data["grades"].append(grade_info)
-                
-                if grade:
-                    total_grades += grade["nilai"]
-                    grade_count += 1
+            student_data["grades"].append({
+                "subject": subject_name,
+                "objective": objective_name,
+                "nilai": nilai
+            })
+            
+            if nilai is not None:
+                graded.append(nilai)
         
         # Calculate average
-        if grade_count > 0:
-            student_data["average"] = round(total_grades / grade_count, 2)
+        if graded:
+            student_data["average"] = mean_grade(graded)
         
         result.append(student_data)
     
     return result
 
+# Only these grade fields are needed to build reports and matrices
+GRADE_MATRIX_FIELDS = {"_id": 0, "kelas": 1, "student_id": 1, "subject_id": 1, "learning_objective_id": 1, "nilai": 1}
+
+def nullable_list(values: np.ndarray) -> list:
+    # NaN is not valid JSON, so missing values become None
+    return np.where(np.isnan(values), None, values).tolist()
+
+async def load_class_grade_matrices(kelas_list: Optional[List[str]] = None, database=None):
+    """Build the grade matrices of several classes (all when None) in one bulk pass."""
+    subjects, objectives, classes = await load_class_report_inputs(kelas_list, database)
+    return {
+        kelas: build_class_grade_matrix(kelas, students, scos, subjects, objectives, grades)
+        for kelas, (students, scos, grades) in classes.items()
+    }
+
+def build_class_grade_matrix(kelas, students, scos, subjects, objectives, grades):
+    """Pivot a class's grades into a students x (subject, objective) matrix.
+    
+    The result is columnar: `values` holds one row per student and one column
+    per configured objective, in the same order as `students` and `columns`.
+    Missing grades, averages and statistics are None.
+    """
+    # Columns are the configured objectives, ordered by their "subject - objective" label
+    column_keys = []
+    for sco in scos:
+        subject_name = subjects.get(sco["subject_id"], {}).get("nama_mata_pelajaran", "")
+        for obj_id in sco["learning_objective_ids"]:
+            objective_name = objectives.get(obj_id, {}).get("tujuan_pembelajaran", "")
+            column_keys.append((f"{subject_name} - {objective_name}", sco["subject_id"], obj_id, subject_name, objective_name))
+    column_keys.sort(key=lambda column: column[0])
+    column_index = pd.MultiIndex.from_tuples(
+        [(subject_id, obj_id) for _, subject_id, obj_id, _, _ in column_keys],
+        names=["subject_id", "learning_objective_id"]
+    )
+    student_ids = [student["id"] for student in students]
+    
+    # Keep the first grade per key, matching the class report
+    frame = pd.DataFrame(grades, columns=["student_id", "subject_id", "learning_objective_id", "nilai"])
+    frame = frame.drop_duplicates(["student_id", "subject_id", "learning_objective_id"], keep="first")
+    matrix = frame.pivot(index="student_id", columns=["subject_id", "learning_objective_id"], values="nilai")
+    values = matrix.reindex(index=student_ids, columns=column_index).to_numpy(dtype=float)
+    
+    graded = ~np.isnan(values)
+    row_counts = graded.sum(axis=1)
+    column_counts = graded.sum(axis=0)
+    # Student averages use the class report's rounding so both always agree
+    row_averages = np.array(
+        [mean_grade(row[mask]) if count else np.nan for row, mask, count in zip(values, graded, row_counts)],
+        dtype=float
+    )
+    with np.errstate(invalid="ignore", divide="ignore"):
+        column_means = np.nansum(values, axis=0) / column_counts
+        column_std = np.sqrt(np.nansum((values - column_means) ** 2, axis=0) / column_counts).round(2)
+        column_means = column_means.round(2)
+    has_column = column_counts > 0
+    column_min = np.where(has_column, np.where(graded, values, np.inf).min(axis=0, initial=np.inf), np.nan)
+    column_max = np.where(has_column, np.where(graded, values, -np.inf).max(axis=0, initial=-np.inf), np.nan)
+    
+    averages = row_averages[row_counts > 0]
+    return {
+        "kelas": kelas,
+        "students": {
+            "id": student_ids,
+            "nama": [student["nama"] for student in students],
+            "nis": [student["nis"] for student in students]
+        },
+        "columns": {
+            "label": [label for label, _, _, _, _ in column_keys],
+            "subject_id": [subject_id for _, subject_id, _, _, _ in column_keys],
+            "learning_objective_id": [obj_id for _, _, obj_id, _, _ in column_keys],
+            "subject": [subject_name for _, _, _, subject_name, _ in column_keys],
+            "objective": [objective_name for _, _, _, _, objective_name in column_keys]
+        },
+        "values": [nullable_list(row) for row in values],
+        "student_averages": nullable_list(row_averages),
+        "column_stats": {
+            "count": column_counts.tolist(),
+            "mean": nullable_list(column_means),
+            "min": nullable_list(column_min),
+            "max": nullable_list(column_max),
+            "std": nullable_list(column_std)
+        },
+        "class_stats": {
+            "student_count": len(students),
+            "graded_student_count": int(averages.size),
+            "average": round(float(averages.mean()), 2) if averages.size else None,
+            "highest": float(averages.max()) if averages.size else None,
+            "lowest": float(averages.min()) if averages.size else None
+        }
+    }
+
+@api_router.get("/reports/grades/{kelas}/matrix")
+async def get_class_grade_matrix(kelas: str):
+    matrices = await load_class_grade_matrices([kelas])
+    if kelas.upper() not in matrices:
+        raise HTTPException(status_code=404, detail="Tidak ada data untuk kelas ini")
+    return matrices[kelas.upper()]
+
+@api_router.get("/reports/averages/{kelas}")
+async def get_class_averages(kelas: str):
+    # Read precomputed totals instead of recomputing from the grades
+    class_summary = await db.class_grade_summaries.find_one({"kelas": kelas.upper()})
+    summaries = await db.grade_summaries.find({"kelas": kelas.upper()}, {"_id": 0}).to_list(None)
+    
+    return {
+        "kelas": kelas.upper(),
+        "average": grade_average(class_summary),
+        "grade_count": class_summary["count"] if class_summary else 0,
+        "students": [
+            {"student_id": summary["student_id"], "average": grade_average(summary), "grade_count": summary["count"]}
+            for summary in summaries
+        ]
+    }
+
+@api_router.post("/reports/averages/rebuild")
+async def rebuild_class_averages():
+    result = await rebuild_grade_summaries()
+    await bump_data_versions("grade_summaries")
+    return {"message": "Ringkasan nilai berhasil dibangun ulang", **result}
+
+# Dashboard Endpoints
+dashboard_cache = TTLCache(maxsize=1, ttl=30)
+
+async def compute_dashboard_summary():
+    student_facets = db.students.aggregate([
+        {"$facet": {
+            "by_class": [{"$group": {"_id": "$kelas", "count": {"$sum": 1}}}],
+            "by_gender": [{"$group": {"_id": "$jenis_kelamin", "count": {"$sum": 1}}}],
+            "by_status": [{"$group": {"_id": "$status", "count": {"$sum": 1}}}]
+        }}
+    ]).to_list(None)
+    objectives_per_class = db.subject_class_objectives.aggregate([
+        {"$group": {"_id": "$kelas", "objectives": {"$sum": {"$size": "$learning_objective_ids"}}}}
+    ]).to_list(None)
+    
+    (
+        facets, objective_rows, class_summaries,
+        subject_count, objective_count, sco_count, grade_count
+    ) = await asyncio.gather(
+        student_facets,
+        objectives_per_class,
+        db.class_grade_summaries.find({}, {"_id": 0}).to_list(None),
+        db.subjects.count_documents({}),
+        db.learning_objectives.count_documents({}),
+        db.subject_class_objectives.count_documents({}),
+        db.grades.count_documents(await hidden_grades_filter())
+    )
+    
+    facets = facets[0]
+    students_by_class = {row["_id"]: row["count"] for row in facets["by_class"]}
+    objectives_by_class = {row["_id"]: row["objectives"] for row in objective_rows}
+    entered_by_class = {summary["kelas"]: summary["count"] for summary in class_summaries}
+    
+    # Completion: configured grades entered versus students x configured objectives
+    completion_by_class = []
+    for kelas in sorted(set(students_by_class) | set(objectives_by_class)):
+        expected = students_by_class.get(kelas, 0) * objectives_by_class.get(kelas, 0)
+        entered = entered_by_class.get(kelas, 0)
+        completion_by_class.append({
+            "kelas": kelas,
+            "students": students_by_class.get(kelas, 0),
+            "objectives": objectives_by_class.get(kelas, 0),
+            "entered": entered,
+            "expected": expected,
+            "rate": round(entered / expected * 100, 2) if expected else 0
+        })
+    total_expected = sum(row["expected"] for row in completion_by_class)
+    total_entered = sum(row["entered"] for row in completion_by_class)
+    
+    return {
+        "counts": {
+            "students": sum(students_by_class.values()),
+            "subjects": subject_count,
+            "learning_objectives": objective_count,
+            "subject_class_objectives": sco_count,
+            "grades": grade_count,
+            "classes": len(students_by_class)
+        },
+        "students_by_class": dict(sorted(students_by_class.items())),
+        "students_by_gender": {row["_id"]: row["count"] for row in facets["by_gender"]},
+        "students_by_status": {row["_id"]: row["count"] for row in facets["by_status"]},
+        "grade_completion": {
+            "entered": total_entered,
+            "expected": total_expected,
+            "rate": round(total_entered / total_expected * 100, 2) if total_expected else 0,
+            "by_class": completion_by_class
+        }
+    }
+
+@api_router.get("/dashboard/summary")
+async def get_dashboard_summary():
+    # Repeated landing page loads do not re-aggregate; keyed by the data
+    # versions, so any write is visible on the next load
+    versions = request_versions.get() or await get_data_versions(DASHBOARD_DEPENDENCIES)
+    cache_key = ("dashboard", tuple(sorted(versions.items())))
+    summary = dashboard_cache.get(cache_key)
+    if summary is CACHE_MISS:
+        summary = await compute_dashboard_summary()
+        dashboard_cache.set(cache_key, summary)
+    return summary
+
+@api_router.get("/system/workbook-pool")
+async def get_workbook_pool_stats():
+    return workbook_pool.stats()
+
+@api_router.get("/system/database-pool")
+async def get_database_pool_stats():
+    return pool_monitor.stats()
+
+@api_router.get("/system/cache")
+async def get_cache_stats():
+    return {
+        "reference": reference_cache.stats(),
+        "dashboard": dashboard_cache.stats(),
+        "exports": export_cache.stats()
+    }
+
+# File formats for templates and exports, chosen with ?format= or the Accept
+# header. CSV and Parquet are written straight from a DataFrame.
+EXPORT_FORMATS = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+def resolve_export_format(requested: Optional[str], accept: Optional[str]) -> str:
+    """Pick the format from the query parameter, then the Accept header, defaulting to xlsx."""
+    if requested:
+        export_format = requested.lower()
+        if export_format not in EXPORT_FORMATS:
+            raise HTTPException(status_code=400, detail=f"Format tidak didukung: {requested}")
+    else:
+        export_format = "xlsx"
+        for media_range in (accept or "").split(","):
+            media_type = media_range.split(";")[0].strip().lower()
+            matched = [name for name, format_media_type in EXPORT_FORMATS.items() if format_media_type == media_type]
+            if matched:
+                export_format = matched[0]
+                break
+    
+    if export_format == "parquet" and pq is None:
+        raise HTTPException(status_code=400, detail="Format parquet membutuhkan paket pyarrow")
+    return export_format
+
+def write_frame(df: pd.DataFrame, target, export_format: str):
+    # `target` may be a path or a binary buffer
+    if export_format == "csv":
+        df.to_csv(target, index=False)
+    else:
+        df.to_parquet(target, index=False)
+
 # Excel Template and Import/Export Endpoints
 @api_router.get("/students/template/download")
-async def download_student_template():
+async def download_student_template(format: Optional[str] = None, accept: Optional[str] = Header(None)):
+    export_format = resolve_export_format(format, accept)
+    if export_format != "xlsx":
+        buffer = BytesIO()
+        write_frame(pd.DataFrame([["Contoh Siswa", "12345", "X1", "Laki-laki", "Aktif"]], columns=STUDENT_IMPORT_COLUMNS), buffer, export_format)
+        return Response(
+            buffer.getvalue(),
+            media_type=EXPORT_FORMATS[export_format],
+            headers={"Content-Disposition": f"attachment; filename=template_data_siswa.{export_format}"}
+        )
+    
     # Create Excel template
     wb = openpyxl.Workbook()
     ws = wb.active
@@ -562,168 +2036,912 @@ async def download_student_template():
         headers={"Content-Disposition": "attachment; filename=template_data_siswa.xlsx"}
     )
 
-@api_router.post("/students/import")
-async def import_students_from_excel(file: UploadFile = File(...)):
-    if not file.filename.endswith(('.xlsx', '.xls')):
-        raise HTTPException(status_code=400, detail="File harus berformat Excel (.xlsx atau .xls)")
+# Workbook offload: parsing and rendering spreadsheets is CPU bound, so it
+# runs in an executor instead of on the event loop. WORKBOOK_EXECUTOR picks a
+# thread pool (default) or a process pool. Once WORKBOOK_MAX_PENDING calls are
+# queued or running, requests are answered with 429 instead of piling up.
+WORKBOOK_EXECUTOR = os.environ.get('WORKBOOK_EXECUTOR', 'thread')
+WORKBOOK_WORKERS = int(os.environ.get('WORKBOOK_WORKERS', '2'))
+WORKBOOK_MAX_PENDING = int(os.environ.get('WORKBOOK_MAX_PENDING', '8'))
+WORKBOOK_RETRY_AFTER_SECONDS = 5
+
+def timed_call(fn, *args, **kwargs):
+    # Runs inside the executor; wall clock so the times compare across processes
+    started_at = time.time()
+    result = fn(*args, **kwargs)
+    return started_at, time.time(), result
+
+class WorkbookPool:
+    """Bounded executor for spreadsheet work with queue wait and execution timings.
     
-    try:
-        # Read Excel file
-        contents = await file.read()
-        df = pd.read_excel(BytesIO(contents))
+    The executors are created by start() in the lifespan handler and released
+    by shutdown(), so the pool can be started again in the same process.
+    """
+    def __init__(self, kind: str, workers: int, max_pending: int):
+        self.kind = kind
+        self.workers = workers
+        self.max_pending = max_pending
+        self.executor = None
+        self.stream_executor = None
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.queue_wait = {"total": 0.0, "max": 0.0}
+        self.execution = {"total": 0.0, "max": 0.0}
+    
+    def start(self):
+        executor_class = ProcessPoolExecutor if self.kind == "process" else ThreadPoolExecutor
+        self.executor = executor_class(max_workers=self.workers)
+        # Iterators keep their state in this process, so streams always use threads
+        self.stream_executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="workbook-stream")
+    
+    def acquire(self, reject: bool):
+        if self.executor is None:
+            raise RuntimeError("Workbook pool belum dijalankan")
+        # Background work passes reject=False and queues behind requests instead
+        if reject and self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=429,
+                detail="Server sedang sibuk memproses file, silakan coba lagi",
+                headers={"Retry-After": str(WORKBOOK_RETRY_AFTER_SECONDS)}
+            )
+        self.pending += 1
+    
+    async def run(self, fn, *args, reject: bool = True, **kwargs):
+        """Run `fn` in the executor; raise 429 when saturated unless `reject` is False."""
+        self.acquire(reject)
+        try:
+            return await self.timed(self.executor, partial(fn, *args, **kwargs))
+        finally:
+            self.pending -= 1
+    
+    async def stream(self, iterator, reject: bool = True):
+        """Yield the items of a blocking iterator, reading one item ahead.
         
-        # Validate columns
-        required_columns = ["Nama", "NIS", "Kelas", "Jenis Kelamin", "Status"]
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        if missing_columns:
-            raise HTTPException(status_code=400, detail=f"Kolom yang hilang: {', '.join(missing_columns)}")
+        Iterators keep their state in this process, so they run on a thread
+        pool of the same size even when the executor is a process pool.
+        """
+        self.acquire(reject)
+        upcoming = None
+        try:
+            upcoming = asyncio.ensure_future(self.timed(self.stream_executor, partial(next, iterator, None)))
+            while (item := await upcoming) is not None:
+                upcoming = asyncio.ensure_future(self.timed(self.stream_executor, partial(next, iterator, None)))
+                yield item
+        finally:
+            self.pending -= 1
+            if upcoming and not upcoming.done():
+                upcoming.cancel()
+    
+    async def timed(self, executor, call):
+        submitted_at = time.time()
+        try:
+            started_at, finished_at, result = await asyncio.get_running_loop().run_in_executor(
+                executor, partial(timed_call, call)
+            )
+        except Exception:
+            self.failed += 1
+            raise
         
-        imported_count = 0
-        duplicate_count = 0
-        error_rows = []
+        self.completed += 1
+        self.record(self.queue_wait, started_at - submitted_at)
+        self.record(self.execution, finished_at - started_at)
+        return result
+    
+    @staticmethod
+    def record(timing, seconds):
+        seconds = max(seconds, 0.0)
+        timing["total"] += seconds
+        timing["max"] = max(timing["max"], seconds)
+    
+    def stats(self):
+        def summary(timing):
+            return {
+                "total_seconds": round(timing["total"], 3),
+                "avg_seconds": round(timing["total"] / self.completed, 3) if self.completed else 0.0,
+                "max_seconds": round(timing["max"], 3)
+            }
         
-        for index, row in df.iterrows():
-            try:
-                # Skip empty rows
-                if pd.isna(row['Nama']) or pd.isna(row['NIS']):
-                    continue
-                
-                # Check for duplicate NIS
-                existing_student = await get_student_by_nis(str(row['NIS']).strip())
-                if existing_student:
-                    duplicate_count += 1
-                    continue
-                
-                # Validate gender
-                gender = str(row['Jenis Kelamin']).strip()
-                if gender not in ["Laki-laki", "Perempuan"]:
-                    error_rows.append(f"Baris {index + 2}: Jenis kelamin tidak valid ({gender})")
-                    continue
-                
-                # Validate status
-                status = str(row['Status']).strip() if not pd.isna(row['Status']) else "Aktif"
-                if status not in ["Aktif", "Tidak Aktif"]:
-                    status = "Aktif"
-                
-                # Create student
-                student_data = StudentCreate(
-                    nama=str(row['Nama']).strip(),
-                    nis=str(row['NIS']).strip(),
-                    kelas=str(row['Kelas']).strip(),
-                    jenis_kelamin=gender,
-                    status=status
-                )
-                
-                student_dict = student_data.dict()
-                student_obj = Student(**student_dict)
-                await db.students.insert_one(student_obj.dict())
-                imported_count += 1
-                
-            except Exception as e:
-                error_rows.append(f"Baris {index + 2}: {str(e)}")
+        return {
+            "executor": self.kind,
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "queue_wait": summary(self.queue_wait),
+            "execution": summary(self.execution)
+        }
+    
+    def shutdown(self):
+        for executor in (self.executor, self.stream_executor):
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+        self.executor = None
+        self.stream_executor = None
+
+workbook_pool = WorkbookPool(WORKBOOK_EXECUTOR, WORKBOOK_WORKERS, WORKBOOK_MAX_PENDING)
+
+STUDENT_IMPORT_COLUMNS = ["Nama", "NIS", "Kelas", "Jenis Kelamin", "Status"]
+STUDENT_IMPORT_EXTENSIONS = ('.xlsx', '.xls', '.csv', '.parquet')
+STUDENT_IMPORT_FORMAT_ERROR = "File harus berformat Excel (.xlsx atau .xls), CSV (.csv) atau Parquet (.parquet)"
+STUDENT_IMPORT_CHUNK_SIZE = 1000
+UPLOAD_SPOOL_CHUNK_BYTES = 1024 * 1024
+
+async def spool_upload(file: UploadFile, directory: Optional[Path] = None) -> Path:
+    """Copy an upload to a local file in fixed-size pieces, keeping its extension."""
+    handle, path = tempfile.mkstemp(suffix=Path(file.filename).suffix.lower(), dir=directory)
+    with os.fdopen(handle, "wb") as spool:
+        while chunk := await file.read(UPLOAD_SPOOL_CHUNK_BYTES):
+            spool.write(chunk)
+    return Path(path)
+
+def iter_student_rows(path: str):
+    """Yield the header and then every row of an uploaded student file as cell values."""
+    suffix = Path(path).suffix.lower()
+    if suffix == ".csv":
+        with open(path, newline="", encoding="utf-8-sig") as handle:
+            # Spreadsheets saved with an Indonesian locale separate fields with ";"
+            dialect = csv.Sniffer().sniff(handle.readline(), delimiters=",;\t")
+            handle.seek(0)
+            yield from csv.reader(handle, dialect)
+    elif suffix == ".parquet":
+        if pq is None:
+            raise HTTPException(status_code=400, detail="Format parquet membutuhkan paket pyarrow")
+        parquet_file = pq.ParquetFile(path)
+        yield parquet_file.schema_arrow.names
+        for batch in parquet_file.iter_batches(batch_size=STUDENT_IMPORT_CHUNK_SIZE):
+            yield from zip(*(column.to_pylist() for column in batch.columns))
+    elif suffix == ".xlsx":
+        workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            yield from workbook.active.iter_rows(values_only=True)
+        finally:
+            workbook.close()
+    else:
+        # Legacy .xls files have no streaming reader
+        df = pd.read_excel(path, dtype=str, header=None)
+        yield from df.itertuples(index=False, name=None)
+
+def cell_text(value) -> Optional[str]:
+    # Same text pd.read_excel(dtype=str) produces, so NIS values such as 00123 stay intact
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return None
+    return str(value)
+
+def iter_student_chunks(path: str, chunk_size: int = STUDENT_IMPORT_CHUNK_SIZE):
+    """Yield DataFrames of at most `chunk_size` rows holding the import columns.
+    
+    The index is the data row position, as pd.read_excel would number it.
+    """
+    rows = iter_student_rows(path)
+    header = [str(cell).strip() if cell is not None else "" for cell in next(rows, ())]
+    
+    # Validate columns
+    missing_columns = [col for col in STUDENT_IMPORT_COLUMNS if col not in header]
+    if missing_columns:
+        raise HTTPException(status_code=400, detail=f"Kolom yang hilang: {', '.join(missing_columns)}")
+    positions = [header.index(col) for col in STUDENT_IMPORT_COLUMNS]
+    
+    chunk = []
+    start = 0
+    for row in rows:
+        chunk.append([cell_text(row[position]) if position < len(row) else None for position in positions])
+        if len(chunk) == chunk_size:
+            yield pd.DataFrame(chunk, columns=STUDENT_IMPORT_COLUMNS, index=range(start, start + len(chunk)))
+            start += len(chunk)
+            chunk = []
+    if chunk:
+        yield pd.DataFrame(chunk, columns=STUDENT_IMPORT_COLUMNS, index=range(start, start + len(chunk)))
+
+def normalize_student_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Strip and normalize the import columns the same way the Student validators do."""
+    df = df[STUDENT_IMPORT_COLUMNS].copy()
+    for column in STUDENT_IMPORT_COLUMNS:
+        df[column] = df[column].astype("string").str.strip()
+    
+    # Excel row number for error messages (header is row 1)
+    df["Baris"] = df.index + 2
+    
+    # Skip empty rows
+    df = df[df["Nama"].fillna("").ne("") & df["NIS"].fillna("").ne("")]
+    
+    df["Nama"] = df["Nama"].str.title()
+    df["NIS"] = df["NIS"].str.upper()
+    df["Kelas"] = df["Kelas"].str.upper()
+    df["Status"] = df["Status"].where(df["Status"].isin([status.value for status in StatusEnum]), StatusEnum.AKTIF.value)
+    return df
+
+class StudentImporter:
+    """Validates and inserts student rows one chunk at a time, keeping running totals.
+    
+    Each chunk is written before the next one is checked, so a NIS repeated in
+    a later chunk is found in the database and counted as a duplicate.
+    """
+    def __init__(self):
+        self.processed = 0
+        self.imported_count = 0
+        self.duplicate_count = 0
+        self.classes = set()
+        self.error_rows = []
+    
+    async def add_chunk(self, df: pd.DataFrame):
+        self.processed += len(df)
+        df = normalize_student_frame(df)
+        
+        # Pre-load existing NIS values with one query
+        existing_nis = set(await db.students.distinct("nis", {"nis": {"$in": df["NIS"].unique().tolist()}}))
+        
+        existing_mask = df["NIS"].isin(existing_nis)
+        gender_mask = df["Jenis Kelamin"].isin([gender.value for gender in GenderEnum])
+        kelas_mask = df["Kelas"].fillna("").ne("")
+        
+        invalid_gender = df[~existing_mask & ~gender_mask]
+        for row_number, gender in zip(invalid_gender["Baris"], invalid_gender["Jenis Kelamin"].fillna("")):
+            self.error_rows.append((row_number, f"Jenis kelamin tidak valid ({gender})"))
+        missing_kelas = df[~existing_mask & gender_mask & ~kelas_mask]
+        for row_number in missing_kelas["Baris"]:
+            self.error_rows.append((row_number, "Kelas tidak boleh kosong"))
+        
+        # Only the first valid occurrence of a NIS inside the chunk is imported
+        candidates = df[~existing_mask & gender_mask & kelas_mask]
+        file_duplicate_mask = candidates["NIS"].duplicated(keep="first")
+        new_students = candidates[~file_duplicate_mask]
+        self.duplicate_count += int(existing_mask.sum() + file_duplicate_mask.sum())
+        if new_students.empty:
+            return
+        
+        now = datetime.utcnow()
+        documents = [
+            {
+                "id": str(uuid.uuid4()),
+                "nama": nama,
+                "nis": nis,
+                "kelas": kelas,
+                "jenis_kelamin": gender,
+                "status": status,
+                "search_tokens": student_search_tokens(nama),
+                "created_at": now,
+                "updated_at": now
+            }
+            for nama, nis, kelas, gender, status in zip(
+                new_students["Nama"], new_students["NIS"], new_students["Kelas"],
+                new_students["Jenis Kelamin"], new_students["Status"]
+            )
+        ]
+        row_numbers = new_students["Baris"].tolist()
+        
+        try:
+            result = await db.students.insert_many(documents, ordered=False)
+            self.imported_count += len(result.inserted_ids)
+        except BulkWriteError as e:
+            self.imported_count += e.details["nInserted"]
+            for write_error in e.details["writeErrors"]:
+                # NIS inserted concurrently since the pre-load counts as a duplicate
+                if write_error["code"] == 11000:
+                    self.duplicate_count += 1
+                else:
+                    self.error_rows.append((row_numbers[write_error["index"]], write_error["errmsg"]))
+        self.classes.update(new_students["Kelas"].unique().tolist())
+    
+    async def finish(self):
+        classes = sorted(self.classes)
+        if self.imported_count:
+            await bump_data_versions("students", *(class_version_key(kelas) for kelas in classes))
+        
+        return {
+            "processed": self.processed,
+            "imported_count": self.imported_count,
+            "duplicate_count": self.duplicate_count,
+            "classes": classes,
+            "error_rows": [f"Baris {row_number}: {message}" for row_number, message in sorted(self.error_rows)]
+        }
+
+async def import_student_file(path: str, on_progress=None, reject: bool = True):
+    """Stream a spooled student file into the database chunk by chunk.
+    
+    The next chunk is parsed on a worker thread while the current one is
+    written, so memory stays bounded by the chunk size. `on_progress(processed)`
+    is awaited after every chunk when given.
+    """
+    importer = StudentImporter()
+    async with contextlib.aclosing(workbook_pool.stream(iter_student_chunks(path), reject=reject)) as chunks:
+        async for chunk in chunks:
+            await importer.add_chunk(chunk)
+            if on_progress:
+                await on_progress(importer.processed)
+    return await importer.finish()
+
+@api_router.post("/students/import")
+async def import_students_from_excel(file: UploadFile = File(...)):
+    if not file.filename.lower().endswith(STUDENT_IMPORT_EXTENSIONS):
+        raise HTTPException(status_code=400, detail=STUDENT_IMPORT_FORMAT_ERROR)
+    
+    path = await spool_upload(file)
+    try:
+        result = await import_student_file(str(path))
         
         return {
             "message": f"Import selesai",
-            "imported_count": imported_count,
-            "duplicate_count": duplicate_count,
-            "error_count": len(error_rows),
-            "errors": error_rows[:10]  # Show first 10 errors
+            "imported_count": result["imported_count"],
+            "duplicate_count": result["duplicate_count"],
+            "error_count": len(result["error_rows"]),
+            "errors": result["error_rows"][:10]  # Show first 10 errors
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error membaca file Excel: {str(e)}")
+    finally:
+        path.unlink(missing_ok=True)
 
-@api_router.get("/reports/grades/{kelas}/export")
-async def export_class_grades_to_excel(kelas: str):
-    # Get grade report data
-    report_data = await get_class_grade_report(kelas)
+def grade_report_sheet_name(kelas: str) -> str:
+    # Excel sheet names are limited to 31 characters without []:*?/\
+    return re.sub(r"[\[\]:*?/\\]", "-", f"Nilai Kelas {kelas}")[:31]
+
+def grade_report_rows(matrix, missing="-"):
+    """Flatten a grade matrix into the header row and the data rows of the export.
     
-    if not report_data:
-        raise HTTPException(status_code=404, detail="Tidak ada data untuk kelas ini")
+    Grades and averages that are not set are written as `missing`.
+    """
+    headers = ["No", "Nama", "NIS", *matrix["columns"]["label"], "Rata-rata"]
     
-    # Create Excel workbook
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = f"Nilai Kelas {kelas}"
+    rows = []
+    students = matrix["students"]
+    for number, (nama, nis, values, average) in enumerate(
+        zip(students["nama"], students["nis"], matrix["values"], matrix["student_averages"]), 1
+    ):
+        row = [number, nama, nis]
+        row.extend(missing if value is None else value for value in values)
+        row.append(missing if average is None else average)
+        rows.append(row)
+    
+    return headers, rows
+
+def write_grade_report_sheet(workbook, sheet_name, matrix, formats):
+    headers, rows = grade_report_rows(matrix)
+    worksheet = workbook.add_worksheet(sheet_name)
     
-    # Create headers
-    headers = ["No", "Nama", "NIS"]
+    # Column widths are computed from the values up front, before any row is flushed
+    widths = [len(str(header)) for header in headers]
+    for row in rows:
+        for col_num, value in enumerate(row):
+            if value is not None:
+                widths[col_num] = max(widths[col_num], len(str(value)))
+    for col_num, width in enumerate(widths):
+        worksheet.set_column(col_num, col_num, min((width + 2) * 1.2, 50))  # Max width 50
     
-    # Get unique subjects and objectives
-    all_objectives = set()
-    for student_data in report_data:
-        for grade in student_data["grades"]:
-            obj_key = f"{grade['subject']} - {grade['objective']}"
-            all_objectives.add(obj_key)
+    # constant_memory mode requires rows to be written strictly in order
+    worksheet.write_row(0, 0, headers, formats["header"])
+    for row_num, row in enumerate(rows, 1):
+        for col_num, value in enumerate(row):
+            if value is None:
+                worksheet.write_blank(row_num, col_num, None, formats["cell"])
+            else:
+                worksheet.write(row_num, col_num, value, formats["cell"])
+
+def render_grade_report_workbook(path, sheets):
+    """Write (sheet name, grade matrix) pairs to an xlsx file at `path`."""
+    workbook = xlsxwriter.Workbook(path, {"constant_memory": True})
+    formats = {
+        "header": workbook.add_format({
+            "bold": True,
+            "font_color": "#FFFFFF",
+            "bg_color": "#366092",
+            "align": "center",
+            "border": 1
+        }),
+        "cell": workbook.add_format({"align": "center", "border": 1})
+    }
+    for sheet_name, matrix in sheets:
+        write_grade_report_sheet(workbook, sheet_name, matrix, formats)
+    workbook.close()
+
+def unique_column_labels(matrices):
+    """Map (subject_id, learning_objective_id) to a label unique across `matrices`.
     
-    sorted_objectives = sorted(list(all_objectives))
-    headers.extend(sorted_objectives)
-    headers.append("Rata-rata")
+    Objective texts are not unique, so a label shared by different columns
+    gets the start of its ids appended.
+    """
+    keys_by_label = defaultdict(set)
+    for matrix in matrices:
+        columns = matrix["columns"]
+        for label, subject_id, objective_id in zip(columns["label"], columns["subject_id"], columns["learning_objective_id"]):
+            keys_by_label[label].add((subject_id, objective_id))
     
-    # Add headers to worksheet
-    for col_num, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col_num, value=header)
-        cell.font = Font(bold=True, color="FFFFFF")
-        cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        cell.alignment = Alignment(horizontal="center")
+    labels = {}
+    for label, keys in keys_by_label.items():
+        objective_ids_distinct = len({objective_id for _, objective_id in keys}) == len(keys)
+        for subject_id, objective_id in keys:
+            if len(keys) == 1:
+                labels[(subject_id, objective_id)] = label
+            elif objective_ids_distinct:
+                labels[(subject_id, objective_id)] = f"{label} [{objective_id[:8]}]"
+            else:
+                labels[(subject_id, objective_id)] = f"{label} [{subject_id[:8]}/{objective_id[:8]}]"
+    return labels
+
+def grade_report_frame(kelas: str, matrix, column_labels) -> pd.DataFrame:
+    # Missing grades become NaN so the grade columns keep a numeric type
+    students = matrix["students"]
+    columns = matrix["columns"]
+    labels = [column_labels[key] for key in zip(columns["subject_id"], columns["learning_objective_id"])]
+    values = np.array(matrix["values"], dtype=float).reshape(len(students["id"]), len(labels))
+    
+    df = pd.DataFrame(values, columns=labels)
+    df.insert(0, "Kelas", kelas.upper())
+    df.insert(1, "No", np.arange(1, len(df) + 1))
+    df.insert(2, "Nama", students["nama"])
+    df.insert(3, "NIS", students["nis"])
+    df["Rata-rata"] = np.array(matrix["student_averages"], dtype=float)
+    return df
+
+def render_grade_report(path, sheets, export_format: str = "xlsx"):
+    """Write (kelas, grade matrix) pairs to `path`.
     
-    # Add student data
-    for row_num, student_data in enumerate(report_data, 2):
-        # Basic info
-        ws.cell(row=row_num, column=1, value=row_num - 1)
-        ws.cell(row=row_num, column=2, value=student_data["student"].nama)
-        ws.cell(row=row_num, column=3, value=student_data["student"].nis)
+    xlsx gets one sheet per class; CSV and Parquet get a single table with a
+    Kelas column.
+    """
+    if export_format == "xlsx":
+        render_grade_report_workbook(path, [
+            (grade_report_sheet_name(kelas), matrix) for kelas, matrix in sheets
+        ])
+    else:
+        # One table for all classes: labels must be unique so concat lines up the right columns
+        column_labels = unique_column_labels([matrix for _, matrix in sheets])
+        frames = [grade_report_frame(kelas, matrix, column_labels) for kelas, matrix in sheets]
+        write_frame(pd.concat(frames, ignore_index=True), path, export_format)
+
+# In-progress files share the cache directory but are never served or evicted
+PARTIAL_FILE_PREFIX = "partial-"
+
+def temporary_export_path(export_format: str = "xlsx", directory: Optional[Path] = None) -> str:
+    handle, path = tempfile.mkstemp(prefix=PARTIAL_FILE_PREFIX, suffix=f".{export_format}", dir=directory)
+    os.close(handle)
+    return path
+
+def export_file_response(path: str, filename: str, export_format: str = "xlsx", delete_after: bool = True) -> FileResponse:
+    # Temporary files are removed once they have been sent
+    return FileResponse(
+        path,
+        media_type=EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+        background=BackgroundTask(os.unlink, path) if delete_after else None
+    )
+
+class ArtifactCache:
+    """Rendered files on local disk, named by a key derived from their inputs.
+    
+    Hits refresh the file's mtime; once the directory grows past `max_bytes`
+    the least recently used files are deleted.
+    """
+    def __init__(self, directory: Path, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.directory.mkdir(parents=True, exist_ok=True)
+    
+    def get(self, name: str) -> Optional[Path]:
+        path = self.directory / name
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+    
+    def put(self, name: str, source_path: str) -> Path:
+        path = self.directory / name
+        os.replace(source_path, path)
+        self.evict()
+        return path
+    
+    def evict(self):
+        files = []
+        for path in self.files():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
         
-        # Grades
-        for grade in student_data["grades"]:
-            obj_key = f"{grade['subject']} - {grade['objective']}"
-            if obj_key in sorted_objectives:
-                col_num = headers.index(obj_key) + 1
-                ws.cell(row=row_num, column=col_num, value=grade["nilai"] if grade["nilai"] is not None else "-")
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+    
+    def files(self):
+        return [
+            path for path in self.directory.iterdir()
+            if path.is_file() and not path.name.startswith(PARTIAL_FILE_PREFIX)
+        ]
+    
+    def stats(self):
+        files = self.files()
+        return {
+            "files": len(files),
+            "bytes": sum(path.stat().st_size for path in files if path.exists()),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+export_cache = ArtifactCache(
+    Path(os.environ.get('EXPORT_CACHE_DIR', Path(tempfile.gettempdir()) / "penilaian_exports")),
+    int(os.environ.get('EXPORT_CACHE_MAX_BYTES', str(200 * 1024 * 1024)))
+)
+
+async def class_export_key(kelas: str, export_format: str = "xlsx") -> str:
+    # Subject and objective names appear in the headers, so their versions count too
+    versions = await get_data_versions([class_version_key(kelas), "subjects", "learning_objectives"])
+    version_key = ",".join(f"{name}:{version}" for name, version in sorted(versions.items()))
+    digest = hashlib.sha1(f"{kelas.upper()}|{version_key}".encode()).hexdigest()
+    return f"{digest}.{export_format}"
+
+async def render_class_export(key: str, kelas: str, matrix, export_format: str = "xlsx", reject: bool = True) -> Path:
+    path = temporary_export_path(export_format, export_cache.directory)
+    try:
+        await workbook_pool.run(render_grade_report, path, [(kelas, matrix)], export_format, reject=reject)
+    except Exception:
+        os.unlink(path)
+        raise
+    return export_cache.put(key, path)
+
+async def warm_export_cache(kelas_list: Optional[List[str]] = None):
+    """Pre-render the exports of the given classes (all when None) that are not cached."""
+    keys = {}
+    for kelas in kelas_list if kelas_list is not None else await db.students.distinct("kelas"):
+        key = await class_export_key(kelas)
+        if export_cache.get(key) is None:
+            keys[kelas.upper()] = key
+    if not keys:
+        return 0
+    
+    matrices = await load_class_grade_matrices(list(keys))
+    for kelas, matrix in matrices.items():
+        await render_class_export(keys[kelas], kelas, matrix, reject=False)
+    return len(matrices)
+
+@api_router.get("/reports/grades/{kelas}/export")
+async def export_class_grades_to_excel(kelas: str, format: Optional[str] = None, accept: Optional[str] = Header(None)):
+    export_format = resolve_export_format(format, accept)
+    filename = f"nilai_kelas_{kelas.replace(' ', '_')}.{export_format}"
+    
+    # Serve the cached file while the class data version is unchanged
+    key = await class_export_key(kelas, export_format)
+    path = export_cache.get(key)
+    if path is None:
+        # Get grade matrix
+        matrices = await load_class_grade_matrices([kelas])
+        
+        if kelas.upper() not in matrices:
+            raise HTTPException(status_code=404, detail="Tidak ada data untuk kelas ini")
         
-        # Average
-        avg_col = len(headers)
-        ws.cell(row=row_num, column=avg_col, value=student_data["average"] if student_data["average"] > 0 else "-")
+        path = await render_class_export(key, kelas, matrices[kelas.upper()], export_format)
     
-    # Auto-adjust column widths
-    for column in ws.columns:
-        max_length = 0
-        column_letter = column[0].column_letter
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = min((max_length + 2) * 1.2, 50)  # Max width 50
-        ws.column_dimensions[column_letter].width = adjusted_width
+    return export_file_response(str(path), filename, export_format, delete_after=False)
+
+@api_router.post("/reports/export/warm")
+async def warm_class_exports(background_tasks: BackgroundTasks, kelas: Optional[str] = None):
+    # Optional comma-separated list of classes, e.g. ?kelas=X1,X2
+    kelas_list = [item.strip() for item in kelas.split(",") if item.strip()] if kelas else None
+    background_tasks.add_task(warm_export_cache, kelas_list)
+    return {"message": "Pembuatan file ekspor dijadwalkan"}
+
+@api_router.get("/reports/school/export")
+async def export_school_grades_to_excel(kelas: Optional[str] = None, format: Optional[str] = None, accept: Optional[str] = Header(None)):
+    export_format = resolve_export_format(format, accept)
     
-    # Add borders
-    thin_border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
+    # Optional comma-separated list of classes, e.g. ?kelas=X1,X2
+    kelas_list = [item.strip() for item in kelas.split(",") if item.strip()] if kelas else None
     
-    for row in ws.iter_rows():
-        for cell in row:
-            cell.border = thin_border
-            if cell.row > 1:  # Data rows
-                cell.alignment = Alignment(horizontal="center")
+    # One bulk load shared by every sheet; nothing is cached, so a secondary may serve it
+    matrices = await load_class_grade_matrices(kelas_list, report_db)
     
-    # Save to BytesIO
-    excel_buffer = BytesIO()
-    wb.save(excel_buffer)
-    excel_buffer.seek(0)
+    if not matrices:
+        raise HTTPException(status_code=404, detail="Tidak ada data untuk kelas yang dipilih")
     
-    filename = f"nilai_kelas_{kelas.replace(' ', '_')}.xlsx"
-    return StreamingResponse(
-        BytesIO(excel_buffer.read()),
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    path = temporary_export_path(export_format)
+    try:
+        await workbook_pool.run(render_grade_report, path, list(matrices.items()), export_format)
+    except Exception:
+        os.unlink(path)
+        raise
+    
+    return export_file_response(path, f"nilai_semua_kelas.{export_format}", export_format)
+
+# Background jobs: large imports and exports run outside the request. Jobs
+# are stored in the `jobs` collection and claimed atomically by worker tasks,
+# so they survive restarts and are shared between uvicorn workers. Running
+# jobs send a heartbeat; jobs whose heartbeat goes stale are claimed again.
+# Idle workers delete finished jobs and their files after JOB_RETENTION_HOURS.
+# Grade cleanups never end as failed: their grades stay hidden until they
+# complete, so a failing cleanup is queued again after a growing delay.
+JOB_DIR = Path(os.environ.get('JOB_DIR', Path(tempfile.gettempdir()) / "penilaian_jobs"))
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+JOB_RETENTION_HOURS = float(os.environ.get('JOB_RETENTION_HOURS', '24'))
+JOB_POLL_SECONDS = 5
+JOB_HEARTBEAT_SECONDS = 30
+JOB_STALE_SECONDS = 600
+JOB_MAX_ATTEMPTS = 3
+JOB_SWEEP_SECONDS = 3600
+JOB_ERROR_BACKOFF_MAX_SECONDS = 300
+# Stored error rows per job; the full count is kept in error_count
+JOB_MAX_STORED_ERRORS = 1000
+JOB_RETRY_BASE_SECONDS = 60
+JOB_RETRY_MAX_SECONDS = 3600
+RETRIED_JOB_TYPES = {"grade_cleanup"}
+
+class JobStatusEnum(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+job_wakeup = asyncio.Event()
+job_worker_tasks = []
+last_job_sweep = 0.0
+
+async def submit_job(job_type: str, params: Dict[str, Any]):
+    now = datetime.utcnow()
+    job = {
+        "id": str(uuid.uuid4()),
+        "type": job_type,
+        "status": JobStatusEnum.QUEUED.value,
+        "params": params,
+        "progress": {"processed": 0, "total": None},
+        "result": None,
+        "result_path": None,
+        "errors": [],
+        "attempts": 0,
+        "retry_at": None,
+        "created_at": now,
+        "updated_at": now
+    }
+    await db.jobs.insert_one(job)
+    job_wakeup.set()
+    return job
+
+async def update_job_progress(job_id: str, processed: int, total: Optional[int]):
+    now = datetime.utcnow()
+    await db.jobs.update_one({"id": job_id}, {"$set": {
+        "progress": {"processed": processed, "total": total},
+        "heartbeat_at": now,
+        "updated_at": now
+    }})
+
+async def claim_next_job():
+    now = datetime.utcnow()
+    return await db.jobs.find_one_and_update(
+        {
+            "$or": [
+                {"status": JobStatusEnum.QUEUED.value},
+                {"status": JobStatusEnum.RUNNING.value, "heartbeat_at": {"$lt": now - timedelta(seconds=JOB_STALE_SECONDS)}},
+                # Cleanups that failed before they were retried automatically
+                {"status": JobStatusEnum.FAILED.value, "type": {"$in": list(RETRIED_JOB_TYPES)}}
+            ],
+            "retry_at": {"$not": {"$gt": now}}
+        },
+        {
+            "$set": {"status": JobStatusEnum.RUNNING.value, "started_at": now, "heartbeat_at": now, "updated_at": now},
+            "$inc": {"attempts": 1}
+        },
+        sort=[("created_at", ASCENDING)],
+        return_document=ReturnDocument.AFTER
     )
 
+async def job_heartbeat(job_id: str):
+    while True:
+        await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+        await db.jobs.update_one({"id": job_id}, {"$set": {"heartbeat_at": datetime.utcnow()}})
+
+async def run_student_import_job(job):
+    async def on_progress(processed):
+        await update_job_progress(job["id"], processed, None)
+    
+    try:
+        result = await import_student_file(job["params"]["path"], on_progress, reject=False)
+    finally:
+        Path(job["params"]["path"]).unlink(missing_ok=True)
+    return {
+        "result": {
+            "imported_count": result["imported_count"],
+            "duplicate_count": result["duplicate_count"],
+            "error_count": len(result["error_rows"])
+        },
+        "progress": {"processed": result["processed"], "total": result["processed"]},
+        "errors": result["error_rows"]
+    }
+
+async def run_grade_export_job(job):
+    matrices = await load_class_grade_matrices(job["params"]["kelas"], report_db)
+    if not matrices:
+        raise HTTPException(status_code=404, detail="Tidak ada data untuk kelas yang dipilih")
+    
+    await update_job_progress(job["id"], 0, len(matrices))
+    export_format = job["params"].get("format", "xlsx")
+    path = str(JOB_DIR / f"{job['id']}.{export_format}")
+    await workbook_pool.run(render_grade_report, path, list(matrices.items()), export_format, reject=False)
+    await update_job_progress(job["id"], len(matrices), len(matrices))
+    return {"result": {"class_count": len(matrices)}, "result_path": path}
+
+async def run_grade_cleanup_job(job):
+    query = grade_cleanup_filter(job["params"])
+    
+    # A resumed job continues from the count it had already reached
+    deleted = job["progress"]["processed"]
+    total = deleted + await db.grades.count_documents(query)
+    await update_job_progress(job["id"], deleted, total)
+    
+    while True:
+        batch = await db.grades.find(query, {"_id": 1}).limit(GRADE_CLEANUP_BATCH_SIZE).to_list(None)
+        if not batch:
+            break
+        result = await db.grades.delete_many({"_id": {"$in": [grade["_id"] for grade in batch]}})
+        deleted += result.deleted_count
+        await update_job_progress(job["id"], deleted, total)
+        # Leave room for regular traffic between batches
+        await asyncio.sleep(GRADE_CLEANUP_PAUSE_SECONDS)
+    
+    return {"result": {"deleted_count": deleted}}
+
+JOB_HANDLERS = {
+    "student_import": run_student_import_job,
+    "grade_export": run_grade_export_job,
+    "grade_cleanup": run_grade_cleanup_job,
+}
+
+async def run_job(job):
+    if job["attempts"] > JOB_MAX_ATTEMPTS and job["type"] not in RETRIED_JOB_TYPES:
+        outcome = {"status": JobStatusEnum.FAILED.value, "errors": ["Job gagal setelah beberapa kali percobaan"]}
+    else:
+        heartbeat = asyncio.create_task(job_heartbeat(job["id"]))
+        try:
+            outcome = await JOB_HANDLERS[job["type"]](job)
+            outcome["status"] = JobStatusEnum.COMPLETED.value
+        except HTTPException as e:
+            outcome = {"status": JobStatusEnum.FAILED.value, "errors": [e.detail]}
+        except Exception as e:
+            logger.exception(f"Job {job['id']} gagal")
+            outcome = {"status": JobStatusEnum.FAILED.value, "errors": [str(e)]}
+        finally:
+            heartbeat.cancel()
+    
+    # Error rows grow with the input file; keep the document under the size limit
+    errors = outcome.get("errors", [])
+    outcome["error_count"] = len(errors)
+    outcome["errors"] = errors[:JOB_MAX_STORED_ERRORS]
+    now = datetime.utcnow()
+    if outcome["status"] == JobStatusEnum.FAILED.value and job["type"] in RETRIED_JOB_TYPES:
+        delay = min(JOB_RETRY_BASE_SECONDS * 2 ** (job["attempts"] - 1), JOB_RETRY_MAX_SECONDS)
+        logger.warning(f"Job {job['id']} gagal, dicoba lagi dalam {delay} detik: {outcome['errors']}")
+        outcome.update(status=JobStatusEnum.QUEUED.value, retry_at=now + timedelta(seconds=delay))
+        await db.jobs.update_one({"id": job["id"]}, {"$set": {**outcome, "updated_at": now}})
+        return
+    await db.jobs.update_one({"id": job["id"]}, {"$set": {**outcome, "finished_at": now, "updated_at": now}})
+
+async def sweep_expired_jobs():
+    """Delete finished jobs older than the retention period, their result
+    files, and files in JOB_DIR that no remaining job refers to."""
+    cutoff = datetime.utcnow() - timedelta(hours=JOB_RETENTION_HOURS)
+    expired = await db.jobs.find({
+        "status": {"$in": [JobStatusEnum.COMPLETED.value, JobStatusEnum.FAILED.value]},
+        "finished_at": {"$lt": cutoff},
+        # A failed cleanup keeps its grades hidden, so its record must stay
+        "$nor": [{"type": "grade_cleanup", "status": JobStatusEnum.FAILED.value}]
+    }, {"_id": 0, "id": 1, "result_path": 1}).to_list(None)
+    for job in expired:
+        if job["result_path"]:
+            Path(job["result_path"]).unlink(missing_ok=True)
+    if expired:
+        await db.jobs.delete_many({"id": {"$in": [job["id"] for job in expired]}})
+    
+    # Files left behind by jobs that were removed or crashed mid-write
+    referenced = set()
+    async for job in db.jobs.find({}, {"_id": 0, "result_path": 1, "params.path": 1}):
+        referenced.update(path for path in (job.get("result_path"), job.get("params", {}).get("path")) if path)
+    file_cutoff = time.time() - JOB_RETENTION_HOURS * 3600
+    orphaned = 0
+    for path in JOB_DIR.glob("*"):
+        if str(path) not in referenced and path.is_file() and path.stat().st_mtime < file_cutoff:
+            path.unlink(missing_ok=True)
+            orphaned += 1
+    return {"job_count": len(expired), "orphaned_file_count": orphaned}
+
+async def job_worker():
+    global last_job_sweep
+    failures = 0
+    while True:
+        # A database error must not end the worker, or queued jobs (and the
+        # grades hidden by pending cleanups) would wait for a restart
+        try:
+            job = await claim_next_job()
+            failures = 0
+            if job is not None:
+                await run_job(job)
+                continue
+            if time.monotonic() - last_job_sweep >= JOB_SWEEP_SECONDS:
+                last_job_sweep = time.monotonic()
+                try:
+                    swept = await sweep_expired_jobs()
+                    if swept["job_count"] or swept["orphaned_file_count"]:
+                        logger.info(f"Job kedaluwarsa dihapus: {swept['job_count']} job, {swept['orphaned_file_count']} file")
+                except Exception:
+                    logger.exception("Gagal menghapus job kedaluwarsa")
+        except Exception:
+            failures += 1
+            logger.exception("Job worker gagal, mencoba lagi")
+            await asyncio.sleep(min(JOB_POLL_SECONDS * 2 ** (failures - 1), JOB_ERROR_BACKOFF_MAX_SECONDS))
+            continue
+        try:
+            await asyncio.wait_for(job_wakeup.wait(), timeout=JOB_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        job_wakeup.clear()
+
+def job_response(job):
+    return {
+        "id": job["id"],
+        "type": job["type"],
+        "status": job["status"],
+        "progress": job["progress"],
+        "result": job["result"],
+        "error_count": job.get("error_count", len(job["errors"])),
+        "errors": job["errors"][:100],
+        "has_download": job["result_path"] is not None,
+        "created_at": job["created_at"],
+        "started_at": job.get("started_at"),
+        "retry_at": job.get("retry_at"),
+        "finished_at": job.get("finished_at")
+    }
+
+@api_router.post("/jobs/students/import")
+async def submit_student_import_job(file: UploadFile = File(...)):
+    if not file.filename.lower().endswith(STUDENT_IMPORT_EXTENSIONS):
+        raise HTTPException(status_code=400, detail=STUDENT_IMPORT_FORMAT_ERROR)
+    
+    # Keep the upload on disk so the job can be resumed after a restart
+    path = await spool_upload(file, JOB_DIR)
+    
+    job = await submit_job("student_import", {"path": str(path), "filename": file.filename})
+    return job_response(job)
+
+@api_router.post("/jobs/exports")
+async def submit_grade_export_job(kelas: Optional[str] = None, format: Optional[str] = None):
+    # The response here is JSON, so the result format only comes from ?format=
+    export_format = resolve_export_format(format, None)
+    
+    # Optional comma-separated list of classes, e.g. ?kelas=X1,X2
+    kelas_list = [item.strip() for item in kelas.split(",") if item.strip()] if kelas else None
+    job = await submit_job("grade_export", {"kelas": kelas_list, "format": export_format})
+    return job_response(job)
+
+@api_router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await db.jobs.find_one({"id": job_id})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job tidak ditemukan")
+    return job_response(job)
+
+@api_router.get("/jobs/{job_id}/result")
+async def download_job_result(job_id: str):
+    job = await db.jobs.find_one({"id": job_id})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job tidak ditemukan")
+    if job["status"] != JobStatusEnum.COMPLETED.value or not job["result_path"]:
+        raise HTTPException(status_code=409, detail="Hasil job belum tersedia")
+    
+    export_format = job["params"].get("format", "xlsx")
+    return export_file_response(job["result_path"], f"nilai_{job_id}.{export_format}", export_format, delete_after=False)
+
 @api_router.get("/")
 async def root():
     return {"message": "Aplikasi Penilaian Guru API", "version": "1.0.0"}
@@ -731,6 +2949,90 @@ async def root():
 # Include the router in the main app
 app.include_router(api_router)
 
+@app.middleware("http")
+async def conditional_get(request, call_next):
+    collection_names = etag_dependencies(request.url.path) if request.method == "GET" else None
+    if collection_names is None:
+        return await call_next(request)
+    
+    versions = await get_data_versions(collection_names)
+    etag = compute_etag(request.url.path, request.url.query, versions)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    
+    # Handlers serve cached data only when it is at least this new
+    token = request_versions.set(versions)
+    try:
+        response = await call_next(request)
+    finally:
+        request_versions.reset(token)
+    if response.status_code == 200:
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "no-cache"
+    return response
+
+def route_template(request) -> str:
+    # Routing sets scope["route"]; responses answered earlier (304) are matched here
+    route = request.scope.get("route")
+    if route is None:
+        for candidate in app.router.routes:
+            if candidate.matches(request.scope)[0] == Match.FULL:
+                route = candidate
+                break
+    return getattr(route, "path", "unmatched")
+
+@app.middleware("http")
+async def record_request_metrics(request, call_next):
+    # Outside conditional_get, so 304 answers are measured too. Streamed bodies
+    # are measured up to the first byte; their later queries count globally only.
+    stats = RequestDbStats()
+    token = request_db_stats.set(stats)
+    started_at = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        duration = time.perf_counter() - started_at
+        request_db_stats.reset(token)
+        route = route_template(request)
+        http_requests.inc((request.method, route, str(status)))
+        http_request_duration.observe((request.method, route), duration)
+        http_request_db_commands.observe((request.method, route), stats.commands)
+        http_request_db_duration.observe((request.method, route), stats.seconds)
+        if duration >= SLOW_REQUEST_SECONDS:
+            logger.warning(
+                f"Request lambat: {request.method} {request.url.path} {status} dalam {duration:.3f} detik, "
+                f"{stats.commands} query database ({stats.seconds:.3f} detik)"
+            )
+
+def database_pool_metrics():
+    pool = pool_monitor.stats()["servers"]
+    connections = Counter("mongodb_pool_connections", "Open pool connections by server and state.", ("server", "state"), "gauge")
+    checkouts = Counter("mongodb_pool_checkouts_total", "Connection checkouts by server.", ("server",))
+    failures = Counter("mongodb_pool_checkout_failures_total", "Failed connection checkouts by server and reason.", ("server", "reason"))
+    wait = Counter("mongodb_pool_checkout_wait_seconds_total", "Time spent waiting for a connection by server.", ("server",))
+    for server, stats in pool.items():
+        connections.set((server, "in_use"), stats["in_use"])
+        connections.set((server, "available"), stats["available"])
+        checkouts.set((server,), stats["checkouts"])
+        for reason, count in stats["checkout_failures"].items():
+            failures.set((server, reason), count)
+        wait.set((server,), stats["checkout_wait"]["total_seconds"])
+    return [connections, checkouts, failures, wait]
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    lines = []
+    for metric in [
+        http_requests, http_request_duration, http_request_db_commands, http_request_db_duration,
+        mongodb_commands, mongodb_command_failures, mongodb_command_duration, *database_pool_metrics()
+    ]:
+        lines.extend(metric.render())
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4; charset=utf-8")
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -746,6 +3048,45 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+async def create_db_indexes():
+    backfilled = await backfill_student_search_tokens()
+    if backfilled:
+        logger.info(f"Token pencarian ditambahkan untuk {backfilled} siswa")
+    
+    report = await ensure_indexes()
+    for collection_name, collection_report in report.items():
+        if collection_report["created"]:
+            logger.info(f"Index dibuat pada {collection_name}: {', '.join(collection_report['created'])}")
+        for name in collection_report["drifted"]:
+            logger.warning(f"Index {collection_name}.{name} berbeda dari deklarasi")
+        for failure in collection_report["failed"]:
+            logger.error(f"Gagal membuat index {collection_name}.{failure}")
+        if collection_report["undeclared"]:
+            logger.warning(f"Index tidak dideklarasikan pada {collection_name}: {', '.join(collection_report['undeclared'])}")
+
+async def start_job_workers():
+    global job_wakeup
+    JOB_DIR.mkdir(parents=True, exist_ok=True)
+    # An Event is bound to the loop it is first awaited on; a new lifespan
+    # (a test client, a reloaded app) runs on a new loop
+    job_wakeup = asyncio.Event()
+    for _ in range(JOB_WORKERS):
+        job_worker_tasks.append(asyncio.create_task(job_worker()))
+
+reference_watch_task = None
+
+async def start_reference_cache_watch():
+    global reference_watch_task
+    if os.environ.get('REFERENCE_CACHE_CHANGE_STREAMS', 'false').lower() == 'true':
+        reference_watch_task = asyncio.create_task(watch_reference_changes())
+
+async def stop_background_tasks():
+    global reference_watch_task
+    tasks = [*job_worker_tasks, *([reference_watch_task] if reference_watch_task else [])]
+    for task in tasks:
+        task.cancel()
+    # Wait until the cancelled tasks have exited before the client closes
+    await asyncio.gather(*tasks, return_exceptions=True)
+    job_worker_tasks.clear()
+    reference_watch_task = None
+    workbook_pool.shutdown()
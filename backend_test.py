@@ -239,6 +239,18 @@ class TeacherGradingAPITester:
         grade_data["nilai"] = 90.0
         success, _ = self.run_test("Update Existing Grade", "POST", "grades", 200, grade_data)
 
+        # Test bulk grade sheet save (invalid rows are reported, not fatal)
+        sheet_data = {
+            "subject_id": subject_id,
+            "kelas": "X1",
+            "learning_objective_id": objective_id,
+            "grades": [
+                {"student_id": self.created_ids['students'][0], "nilai": 88.0},
+                {"student_id": self.created_ids['students'][0], "nilai": 150}
+            ]
+        }
+        success, _ = self.run_test("Bulk Save Grade Sheet", "POST", "grades/bulk", 200, sheet_data)
+
         return True
 
     def test_reports(self):
@@ -250,6 +262,15 @@ class TeacherGradingAPITester:
         # Test get class grade report
         success, _ = self.run_test("Get Class Grade Report", "GET", "reports/grades/X1", 200)
 
+        # Test grade matrix with class statistics
+        success, _ = self.run_test("Get Class Grade Matrix", "GET", "reports/grades/X1/matrix", 200)
+
+        # Test dashboard summary counts
+        success, _ = self.run_test("Get Dashboard Summary", "GET", "dashboard/summary", 200)
+
+        # Test database connection pool statistics
+        success, _ = self.run_test("Get Database Pool Stats", "GET", "system/database-pool", 200)
+
         return True
 
     def test_excel_operations(self):
@@ -264,6 +285,17 @@ class TeacherGradingAPITester:
         # Test export class grades
         success, _ = self.run_test("Export Class Grades", "GET", "reports/grades/X1/export", 200)
 
+        # Test export of several classes into one workbook
+        success, _ = self.run_test("Export School Grades", "GET", "reports/school/export", 200, params={"kelas": "X1,X2"})
+
+        # Test export as CSV
+        success, _ = self.run_test("Export Class Grades CSV", "GET", "reports/grades/X1/export", 200, params={"format": "csv"})
+
+        # Test export as a background job
+        success, job = self.run_test("Submit Export Job", "POST", "jobs/exports?kelas=X1", 200)
+        if success and 'id' in job:
+            self.run_test("Get Export Job", "GET", f"jobs/{job['id']}", 200)
+
         return True
 
     def cleanup(self):
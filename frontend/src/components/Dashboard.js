@@ -22,18 +22,14 @@ const Dashboard = () => {
     try {
       setLoading(true);
       
-      const [studentsRes, subjectsRes, objectivesRes, classesRes] = await Promise.all([
-        axios.get(`${API}/students`),
-        axios.get(`${API}/subjects`),
-        axios.get(`${API}/learning-objectives`),
-        axios.get(`${API}/students/classes/list`)
-      ]);
+      const response = await axios.get(`${API}/dashboard/summary`);
+      const { counts } = response.data;
 
       setStats({
-        totalStudents: studentsRes.data.length,
-        totalSubjects: subjectsRes.data.length,
-        totalObjectives: objectivesRes.data.length,
-        totalClasses: classesRes.data.length
+        totalStudents: counts.students,
+        totalSubjects: counts.subjects,
+        totalObjectives: counts.learning_objectives,
+        totalClasses: counts.classes
       });
     } catch (error) {
       console.error('Error fetching dashboard stats:', error);
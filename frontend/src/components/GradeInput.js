@@ -6,6 +6,7 @@ import {
   ClipboardDocumentListIcon,
   CheckIcon
 } from '@heroicons/react/24/outline';
+import { fetchAllPages } from '../lib/pagination';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -51,11 +52,11 @@ const GradeInput = () => {
   const fetchInitialData = async () => {
     try {
       const [subjectsRes, classesRes] = await Promise.all([
-        axios.get(`${API}/subjects`),
+        fetchAllPages(`${API}/subjects`),
         axios.get(`${API}/students/classes/list`)
       ]);
 
-      setSubjects(subjectsRes.data);
+      setSubjects(subjectsRes);
       setClasses(classesRes.data);
     } catch (error) {
       console.error('Error fetching initial data:', error);
@@ -80,7 +81,8 @@ const GradeInput = () => {
     try {
       setLoading(true);
       const response = await axios.get(
-        `${API}/grades/${selectedSubject}/${selectedClass}/${selectedObjective}`
+        `${API}/grades/${selectedSubject}/${selectedClass}/${selectedObjective}`,
+        { params: { compact: true } }
       );
       
       const studentsData = response.data;
@@ -117,25 +119,30 @@ const GradeInput = () => {
   const saveGrades = async () => {
     try {
       setSaving(true);
-      const promises = [];
+      const rows = [];
       
       for (const studentId in grades) {
         const nilai = grades[studentId];
         if (nilai !== '' && !isNaN(parseFloat(nilai))) {
-          const gradeData = {
+          rows.push({
             student_id: studentId,
-            subject_id: selectedSubject,
-            kelas: selectedClass,
-            learning_objective_id: selectedObjective,
             nilai: parseFloat(nilai)
-          };
-          
-          promises.push(axios.post(`${API}/grades`, gradeData));
+          });
         }
       }
       
-      await Promise.all(promises);
-      alert('Nilai berhasil disimpan');
+      const response = await axios.post(`${API}/grades/bulk`, {
+        subject_id: selectedSubject,
+        kelas: selectedClass,
+        learning_objective_id: selectedObjective,
+        grades: rows
+      });
+      
+      if (response.data.error_count > 0) {
+        alert(`${response.data.saved_count} nilai disimpan, ${response.data.error_count} gagal`);
+      } else {
+        alert('Nilai berhasil disimpan');
+      }
       
       // Refresh data
       await fetchStudentsAndGrades();
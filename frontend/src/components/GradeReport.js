@@ -13,7 +13,7 @@ const API = `${BACKEND_URL}/api`;
 const GradeReport = () => {
   const [classes, setClasses] = useState([]);
   const [selectedClass, setSelectedClass] = useState('');
-  const [reportData, setReportData] = useState([]);
+  const [matrix, setMatrix] = useState(null);
   const [loading, setLoading] = useState(false);
   const [exporting, setExporting] = useState(false);
   const [showReport, setShowReport] = useState(false);
@@ -40,13 +40,18 @@ const GradeReport = () => {
 
     try {
       setLoading(true);
-      const response = await axios.get(`${API}/reports/grades/${selectedClass}`);
-      setReportData(response.data);
+      const response = await axios.get(`${API}/reports/grades/${selectedClass}/matrix`);
+      setMatrix(response.data);
       setShowReport(true);
     } catch (error) {
+      if (error.response && error.response.status === 404) {
+        setMatrix(null);
+        setShowReport(true);
+        return;
+      }
       console.error('Error fetching grade report:', error);
       alert('Gagal mengambil rekapan nilai');
-      setReportData([]);
+      setMatrix(null);
       setShowReport(false);
     } finally {
       setLoading(false);
@@ -95,52 +100,30 @@ const GradeReport = () => {
     return 'Perlu Perbaikan';
   };
 
-  // Group grades by subject and objective
-  const getGroupedGrades = () => {
-    if (reportData.length === 0) return {};
-    
-    const grouped = {};
-    
-    reportData.forEach(studentData => {
-      studentData.grades.forEach(grade => {
-        const key = `${grade.subject} - ${grade.objective}`;
-        if (!grouped[key]) {
-          grouped[key] = [];
-        }
-        grouped[key].push({
-          student: studentData.student.nama,
-          nilai: grade.nilai
-        });
-      });
-    });
-    
-    return grouped;
-  };
-
+  // Class statistics are computed by the matrix endpoint
   const calculateStats = () => {
-    if (reportData.length === 0) return null;
-    
-    const allAverages = reportData
-      .map(student => student.average)
-      .filter(avg => avg > 0);
-    
-    if (allAverages.length === 0) return null;
-    
-    const classAverage = allAverages.reduce((sum, avg) => sum + avg, 0) / allAverages.length;
-    const highest = Math.max(...allAverages);
-    const lowest = Math.min(...allAverages);
+    if (!matrix || matrix.class_stats.graded_student_count === 0) return null;
     
+    const classStats = matrix.class_stats;
     return {
-      classAverage: classAverage.toFixed(2),
-      highest: highest.toFixed(2),
-      lowest: lowest.toFixed(2),
-      totalStudents: reportData.length,
-      studentsWithGrades: allAverages.length
+      classAverage: classStats.average.toFixed(2),
+      highest: classStats.highest.toFixed(2),
+      lowest: classStats.lowest.toFixed(2),
+      totalStudents: classStats.student_count,
+      studentsWithGrades: classStats.graded_student_count
     };
   };
 
+  const formatStat = (value) => (value === null ? '-' : value.toFixed(2));
+
   const stats = calculateStats();
-  const groupedGrades = getGroupedGrades();
+  const studentCount = matrix ? matrix.students.id.length : 0;
+  const columnStatRows = matrix ? [
+    { label: 'Rata-rata', values: matrix.column_stats.mean },
+    { label: 'Tertinggi', values: matrix.column_stats.max },
+    { label: 'Terendah', values: matrix.column_stats.min },
+    { label: 'Simpangan Baku', values: matrix.column_stats.std }
+  ] : [];
 
   return (
     <div className="space-y-6">
@@ -164,7 +147,7 @@ const GradeReport = () => {
               onChange={(e) => {
                 setSelectedClass(e.target.value);
                 setShowReport(false);
-                setReportData([]);
+                setMatrix(null);
               }}
               className="w-full px-3 py-2 border border-gray-300 rounded-md focus:outline-none focus:ring-2 focus:ring-blue-500"
             >
@@ -272,7 +255,7 @@ const GradeReport = () => {
             </p>
           </div>
 
-          {reportData.length === 0 ? (
+          {studentCount === 0 ? (
             <div className="px-6 py-8 text-center text-gray-500">
               Tidak ada data nilai untuk kelas ini
             </div>
@@ -284,8 +267,8 @@ const GradeReport = () => {
                     <th className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">No</th>
                     <th className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">Nama Siswa</th>
                     <th className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">NIS</th>
-                    {Object.keys(groupedGrades).map((subjectObjective) => (
-                      <th key={subjectObjective} className="px-4 py-3 text-center text-xs font-medium text-gray-500 uppercase tracking-wider min-w-[120px]">
+                    {matrix.columns.label.map((subjectObjective, columnIndex) => (
+                      <th key={columnIndex} className="px-4 py-3 text-center text-xs font-medium text-gray-500 uppercase tracking-wider min-w-[120px]">
                         {subjectObjective}
                       </th>
                     ))}
@@ -294,76 +277,89 @@ const GradeReport = () => {
                   </tr>
                 </thead>
                 <tbody className="bg-white divide-y divide-gray-200">
-                  {reportData.map((studentData, index) => (
-                    <tr key={studentData.student.id} className="hover:bg-gray-50">
-                      <td className="px-6 py-4 whitespace-nowrap text-sm text-gray-900">
-                        {index + 1}
-                      </td>
-                      <td className="px-6 py-4 whitespace-nowrap text-sm font-medium text-gray-900">
-                        {studentData.student.nama}
-                      </td>
-                      <td className="px-6 py-4 whitespace-nowrap text-sm text-gray-900">
-                        {studentData.student.nis}
-                      </td>
-                      
-                      {/* Grade columns */}
-                      {Object.keys(groupedGrades).map((subjectObjective) => {
-                        const grade = studentData.grades.find(g => 
-                          `${g.subject} - ${g.objective}` === subjectObjective
-                        );
-                        return (
-                          <td key={subjectObjective} className="px-4 py-4 whitespace-nowrap text-center text-sm">
-                            {grade && grade.nilai !== null ? (
-                              <span className={`font-medium ${getGradeColor(grade.nilai)}`}>
-                                {grade.nilai}
+                  {matrix.students.id.map((studentId, index) => {
+                    const average = matrix.student_averages[index];
+                    return (
+                      <tr key={studentId} className="hover:bg-gray-50">
+                        <td className="px-6 py-4 whitespace-nowrap text-sm text-gray-900">
+                          {index + 1}
+                        </td>
+                        <td className="px-6 py-4 whitespace-nowrap text-sm font-medium text-gray-900">
+                          {matrix.students.nama[index]}
+                        </td>
+                        <td className="px-6 py-4 whitespace-nowrap text-sm text-gray-900">
+                          {matrix.students.nis[index]}
+                        </td>
+                        
+                        {/* Grade columns */}
+                        {matrix.values[index].map((nilai, columnIndex) => (
+                          <td key={columnIndex} className="px-4 py-4 whitespace-nowrap text-center text-sm">
+                            {nilai !== null ? (
+                              <span className={`font-medium ${getGradeColor(nilai)}`}>
+                                {nilai}
                               </span>
                             ) : (
                               <span className="text-gray-400">-</span>
                             )}
                           </td>
-                        );
-                      })}
-                      
-                      <td className="px-6 py-4 whitespace-nowrap text-center text-sm">
-                        {studentData.average > 0 ? (
-                          <span className={`font-bold ${getGradeColor(studentData.average)}`}>
-                            {studentData.average}
-                          </span>
-                        ) : (
-                          <span className="text-gray-400">-</span>
-                        )}
-                      </td>
-                      
-                      <td className="px-6 py-4 whitespace-nowrap text-center">
-                        {studentData.average > 0 ? (
-                          <span className={`inline-flex px-2 py-1 text-xs font-semibold rounded-full ${
-                            studentData.average >= 85
-                              ? 'bg-green-100 text-green-800'
-                              : studentData.average >= 70
-                              ? 'bg-yellow-100 text-yellow-800'
-                              : 'bg-red-100 text-red-800'
-                          }`}>
-                            {getGradeStatus(studentData.average)}
-                          </span>
-                        ) : (
-                          <span className="inline-flex px-2 py-1 text-xs font-semibold rounded-full bg-gray-100 text-gray-800">
-                            Belum Ada Nilai
-                          </span>
-                        )}
+                        ))}
+                        
+                        <td className="px-6 py-4 whitespace-nowrap text-center text-sm">
+                          {average !== null ? (
+                            <span className={`font-bold ${getGradeColor(average)}`}>
+                              {average}
+                            </span>
+                          ) : (
+                            <span className="text-gray-400">-</span>
+                          )}
+                        </td>
+                        
+                        <td className="px-6 py-4 whitespace-nowrap text-center">
+                          {average !== null ? (
+                            <span className={`inline-flex px-2 py-1 text-xs font-semibold rounded-full ${
+                              average >= 85
+                                ? 'bg-green-100 text-green-800'
+                                : average >= 70
+                                ? 'bg-yellow-100 text-yellow-800'
+                                : 'bg-red-100 text-red-800'
+                            }`}>
+                              {getGradeStatus(average)}
+                            </span>
+                          ) : (
+                            <span className="inline-flex px-2 py-1 text-xs font-semibold rounded-full bg-gray-100 text-gray-800">
+                              Belum Ada Nilai
+                            </span>
+                          )}
+                        </td>
+                      </tr>
+                    );
+                  })}
+                </tbody>
+                <tfoot className="bg-gray-50">
+                  {columnStatRows.map((statRow) => (
+                    <tr key={statRow.label}>
+                      <td colSpan={3} className="px-6 py-2 text-sm font-medium text-gray-700">
+                        {statRow.label}
                       </td>
+                      {statRow.values.map((value, columnIndex) => (
+                        <td key={columnIndex} className="px-4 py-2 text-center text-sm text-gray-700">
+                          {formatStat(value)}
+                        </td>
+                      ))}
+                      <td colSpan={2}></td>
                     </tr>
                   ))}
-                </tbody>
+                </tfoot>
               </table>
             </div>
           )}
 
-          {reportData.length > 0 && (
+          {studentCount > 0 && (
             <div className="bg-gray-50 px-6 py-4 border-t">
               <div className="text-sm text-gray-600">
-                <p>Total siswa: {reportData.length} | 
-                   Sudah memiliki nilai: {reportData.filter(s => s.average > 0).length} |
-                   Belum memiliki nilai: {reportData.filter(s => s.average === 0).length}
+                <p>Total siswa: {studentCount} | 
+                   Sudah memiliki nilai: {matrix.class_stats.graded_student_count} |
+                   Belum memiliki nilai: {studentCount - matrix.class_stats.graded_student_count}
                 </p>
               </div>
             </div>
@@ -9,6 +9,7 @@ import {
   DocumentArrowUpIcon,
   ExclamationTriangleIcon
 } from '@heroicons/react/24/outline';
+import { fetchAllPages } from '../lib/pagination';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -48,8 +49,7 @@ const StudentManagement = () => {
   const fetchStudents = async () => {
     try {
       setLoading(true);
-      const response = await axios.get(`${API}/students`);
-      setStudents(response.data);
+      setStudents(await fetchAllPages(`${API}/students`));
     } catch (error) {
       console.error('Error fetching students:', error);
       alert('Gagal mengambil data siswa');
@@ -250,7 +250,7 @@ const StudentManagement = () => {
           <div className="flex-1">
             <input
               type="file"
-              accept=".xlsx,.xls"
+              accept=".xlsx,.xls,.csv"
               onChange={(e) => setImportFile(e.target.files[0])}
               className="w-full px-3 py-2 border border-gray-300 rounded-md focus:outline-none focus:ring-2 focus:ring-blue-500"
             />
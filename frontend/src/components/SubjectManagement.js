@@ -8,6 +8,7 @@ import {
   ClipboardDocumentListIcon,
   Cog6ToothIcon
 } from '@heroicons/react/24/outline';
+import { fetchAllPages } from '../lib/pagination';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -50,15 +51,15 @@ const SubjectManagement = () => {
     try {
       setLoading(true);
       const [subjectsRes, objectivesRes, configurationsRes, classesRes] = await Promise.all([
-        axios.get(`${API}/subjects`),
-        axios.get(`${API}/learning-objectives`),
-        axios.get(`${API}/subject-class-objectives`),
+        fetchAllPages(`${API}/subjects`),
+        fetchAllPages(`${API}/learning-objectives`),
+        fetchAllPages(`${API}/subject-class-objectives`),
         axios.get(`${API}/students/classes/list`)
       ]);
 
-      setSubjects(subjectsRes.data);
-      setObjectives(objectivesRes.data);
-      setConfigurations(configurationsRes.data);
+      setSubjects(subjectsRes);
+      setObjectives(objectivesRes);
+      setConfigurations(configurationsRes);
       setClasses(classesRes.data);
     } catch (error) {
       console.error('Error fetching data:', error);
@@ -0,0 +1,18 @@
+import axios from "axios";
+
+// Largest page the list endpoints serve (MAX_PAGE_SIZE in the backend)
+const PAGE_SIZE = 500;
+
+// Fetch every item of a paginated list endpoint by following next_cursor
+export async function fetchAllPages(url, params = {}) {
+  const items = [];
+  let cursor = null;
+  do {
+    const response = await axios.get(url, {
+      params: { ...params, limit: PAGE_SIZE, ...(cursor ? { cursor } : {}) }
+    });
+    items.push(...response.data.items);
+    cursor = response.data.next_cursor;
+  } while (cursor);
+  return items;
+}
@@ -0,0 +1,363 @@
+"""Load test for the grading API against a seeded synthetic school.
+
+Seeds classes, students, subjects, objectives and grades straight into the
+database, then drives the app in-process (httpx ASGI transport, so no network
+in the numbers) with concurrent requests per scenario. For every scenario it
+reports throughput, p50/p95/p99 latency and MongoDB round-trips per request,
+and writes everything to a JSON file so runs can be compared across commits:
+
+    python load_benchmark.py --size medium
+    python load_benchmark.py --mock --size small --compare benchmark_results/previous.json
+
+Uses MONGO_URL (default mongodb://localhost:27017), or mongomock-motor with
+--mock, which reports no round-trips (db_commands_per_request is null). The
+benchmark database is emptied first, so its name must contain "benchmark".
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+import numpy as np
+import pandas as pd
+
+ROOT_DIR = Path(__file__).parent
+
+SIZES = {
+    "small": {"classes": 4, "students_per_class": 30, "subjects": 5, "objectives_per_subject": 4},
+    "medium": {"classes": 12, "students_per_class": 32, "subjects": 10, "objectives_per_subject": 6},
+    "large": {"classes": 36, "students_per_class": 36, "subjects": 14, "objectives_per_subject": 8},
+}
+SCENARIOS = [
+    "grade_entry", "grade_sheet", "class_report", "class_matrix",
+    "class_export", "school_export", "student_import"
+]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the grading API against a synthetic school")
+    parser.add_argument("--size", choices=SIZES, default="small")
+    parser.add_argument("--classes", type=int)
+    parser.add_argument("--students-per-class", type=int)
+    parser.add_argument("--subjects", type=int)
+    parser.add_argument("--objectives-per-subject", type=int)
+    parser.add_argument("--grade-fill", type=float, default=0.9, help="Share of configured grades that exist")
+    parser.add_argument("--requests", type=int, default=50, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--import-rows", type=int, default=200, help="Students per import file")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mock", action="store_true", help="Use mongomock-motor instead of MongoDB")
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db-name", default="penilaian_benchmark")
+    parser.add_argument("--output", help="Result file (default benchmark_results/<time>_<commit>.json)")
+    parser.add_argument("--compare", help="Earlier result file to compare latencies against")
+    args = parser.parse_args()
+
+    args.school = dict(SIZES[args.size])
+    for name in args.school:
+        if getattr(args, name) is not None:
+            args.school[name] = getattr(args, name)
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    if "benchmark" not in args.db_name:
+        parser.error("--db-name must contain 'benchmark', the database is emptied before seeding")
+    return args
+
+def load_server(args):
+    # The server reads its settings at import time
+    os.environ["MONGO_URL"] = args.mongo_url
+    os.environ["DB_NAME"] = args.db_name
+    if args.mock:
+        import motor.motor_asyncio
+        import mongomock_motor
+        motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+    sys.path.insert(0, str(ROOT_DIR / "backend"))
+    import server
+    return server
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+class School:
+    """Ids of the seeded data, used to build request payloads."""
+    def __init__(self, classes, students_by_class, subject_ids, objectives_by_subject):
+        self.classes = classes
+        self.students_by_class = students_by_class
+        self.subject_ids = subject_ids
+        self.objectives_by_subject = objectives_by_subject
+
+async def seed_school(server, config, grade_fill, rng):
+    """Empty the benchmark database and insert a school built with the server models."""
+    def new_id():
+        return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+    for name in await server.db.list_collection_names():
+        await server.db[name].delete_many({})
+    server.reference_cache.clear()
+
+    levels = ["X", "XI", "XII"]
+    classes = [
+        f"{levels[index % len(levels)]}{index // len(levels) + 1}"
+        for index in range(config["classes"])
+    ]
+    students_by_class = {}
+    students = []
+    for kelas in classes:
+        students_by_class[kelas] = []
+        for number in range(config["students_per_class"]):
+            student = server.Student(
+                id=new_id(),
+                nama=f"Siswa {kelas} {number + 1}",
+                nis=f"{kelas}{number + 1:04d}",
+                kelas=kelas,
+                jenis_kelamin=rng.choice(list(server.GenderEnum))
+            )
+            students.append(student.dict())
+            students_by_class[kelas].append(student.id)
+
+    subjects = [
+        server.Subject(id=new_id(), nama_mata_pelajaran=f"Mata Pelajaran {number + 1}").dict()
+        for number in range(config["subjects"])
+    ]
+    objectives = []
+    objectives_by_subject = {}
+    for subject in subjects:
+        objectives_by_subject[subject["id"]] = []
+        for number in range(config["objectives_per_subject"]):
+            objective = server.LearningObjective(
+                id=new_id(), tujuan_pembelajaran=f"{subject['nama_mata_pelajaran']} tujuan {number + 1}"
+            )
+            objectives.append(objective.dict())
+            objectives_by_subject[subject["id"]].append(objective.id)
+
+    scos = []
+    grades = []
+    for kelas in classes:
+        for subject in subjects:
+            objective_ids = objectives_by_subject[subject["id"]]
+            scos.append(server.SubjectClassObjective(
+                id=new_id(), subject_id=subject["id"], kelas=kelas, learning_objective_ids=objective_ids
+            ).dict())
+            for student_id in students_by_class[kelas]:
+                for objective_id in objective_ids:
+                    if rng.random() < grade_fill:
+                        grades.append(server.Grade(
+                            id=new_id(), student_id=student_id, subject_id=subject["id"], kelas=kelas,
+                            learning_objective_id=objective_id, nilai=rng.randint(40, 100)
+                        ).dict())
+
+    for collection, documents in [
+        (server.db.students, students),
+        (server.db.subjects, subjects),
+        (server.db.learning_objectives, objectives),
+        (server.db.subject_class_objectives, scos),
+        (server.db.grades, grades),
+    ]:
+        for start in range(0, len(documents), 5000):
+            await collection.insert_many(documents[start:start + 5000], ordered=False)
+    await server.backfill_student_search_tokens()
+    await server.rebuild_grade_summaries()
+
+    counts = {
+        "classes": len(classes),
+        "students": len(students),
+        "subjects": len(subjects),
+        "learning_objectives": len(objectives),
+        "subject_class_objectives": len(scos),
+        "grades": len(grades)
+    }
+    return School(classes, students_by_class, [subject["id"] for subject in subjects], objectives_by_subject), counts
+
+def student_import_file(batch: int, rows: int) -> bytes:
+    kelas = f"IMPOR{batch}"
+    frame = pd.DataFrame({
+        "Nama": [f"Siswa Impor {batch} {number}" for number in range(rows)],
+        "NIS": [f"{kelas}-{number:05d}" for number in range(rows)],
+        "Kelas": kelas,
+        "Jenis Kelamin": ["Laki-laki" if number % 2 else "Perempuan" for number in range(rows)],
+        "Status": "Aktif"
+    })
+    buffer = io.BytesIO()
+    frame.to_excel(buffer, index=False)
+    return buffer.getvalue()
+
+def scenario_requests(name, school, rng, count, import_rows):
+    """(method, route template, request kwargs) for each request of a scenario."""
+    def graded_cell():
+        kelas = rng.choice(school.classes)
+        subject_id = rng.choice(school.subject_ids)
+        return kelas, subject_id, rng.choice(school.objectives_by_subject[subject_id])
+
+    for index in range(count):
+        if name == "grade_entry":
+            kelas, subject_id, objective_id = graded_cell()
+            yield "POST", "/api/grades", {"url": "/api/grades", "json": {
+                "student_id": rng.choice(school.students_by_class[kelas]), "subject_id": subject_id,
+                "kelas": kelas, "learning_objective_id": objective_id, "nilai": rng.randint(40, 100)
+            }}
+        elif name == "grade_sheet":
+            kelas, subject_id, objective_id = graded_cell()
+            yield "POST", "/api/grades/bulk", {"url": "/api/grades/bulk", "json": {
+                "subject_id": subject_id, "kelas": kelas, "learning_objective_id": objective_id,
+                "grades": [
+                    {"student_id": student_id, "nilai": rng.randint(40, 100)}
+                    for student_id in school.students_by_class[kelas]
+                ]
+            }}
+        elif name == "class_report":
+            yield "GET", "/api/reports/grades/{kelas}", {"url": f"/api/reports/grades/{rng.choice(school.classes)}"}
+        elif name == "class_matrix":
+            yield "GET", "/api/reports/grades/{kelas}/matrix", {"url": f"/api/reports/grades/{rng.choice(school.classes)}/matrix"}
+        elif name == "class_export":
+            # Served from the export cache once a class has been rendered
+            yield "GET", "/api/reports/grades/{kelas}/export", {"url": f"/api/reports/grades/{rng.choice(school.classes)}/export"}
+        elif name == "school_export":
+            kelas_list = rng.sample(school.classes, min(4, len(school.classes)))
+            yield "GET", "/api/reports/school/export", {"url": "/api/reports/school/export", "params": {"kelas": ",".join(kelas_list)}}
+        elif name == "student_import":
+            yield "POST", "/api/students/import", {"url": "/api/students/import", "files": {
+                "file": (f"siswa_{index}.xlsx", student_import_file(index, import_rows))
+            }}
+
+def percentiles(latencies):
+    if not latencies:
+        return {}
+    values = np.array(latencies) * 1000
+    return {
+        "min": round(float(values.min()), 3),
+        "mean": round(float(values.mean()), 3),
+        "p50": round(float(np.percentile(values, 50)), 3),
+        "p95": round(float(np.percentile(values, 95)), 3),
+        "p99": round(float(np.percentile(values, 99)), 3),
+        "max": round(float(values.max()), 3)
+    }
+
+def db_command_totals(server, method, route):
+    series = server.http_request_db_commands.series.get((method, route))
+    return (series["sum"], series["count"]) if series else (0, 0)
+
+async def run_scenario(server, http, name, school, args, rng):
+    # Payloads are built up front so their cost stays out of the timings
+    requests = list(scenario_requests(name, school, rng, args.requests, args.import_rows))
+    method, route = requests[0][0], requests[0][1]
+    commands_before, counted_before = db_command_totals(server, method, route)
+
+    latencies = []
+    statuses = {}
+    pending = iter(requests)
+
+    async def worker():
+        for request_method, _, kwargs in pending:
+            started_at = time.perf_counter()
+            response = await http.request(request_method, **kwargs)
+            latencies.append(time.perf_counter() - started_at)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+    duration = time.perf_counter() - started_at
+
+    commands_after, counted_after = db_command_totals(server, method, route)
+    counted = counted_after - counted_before
+    errors = sum(count for status, count in statuses.items() if status >= 400)
+    return {
+        "method": method,
+        "route": route,
+        "requests": len(requests),
+        "concurrency": args.concurrency,
+        "errors": errors,
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "duration_seconds": round(duration, 3),
+        "throughput_rps": round(len(requests) / duration, 2) if duration else 0.0,
+        "latency_ms": percentiles(latencies),
+        # mongomock emits no command events, so there is nothing to count
+        "db_commands_per_request": round((commands_after - commands_before) / counted, 2) if counted and not args.mock else None
+    }
+
+def print_results(results, baseline=None):
+    print(f"{'scenario':<16}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'db/req':>8}{'errors':>8}", end="")
+    print(f"{'p95 vs base':>13}" if baseline else "")
+    for name, result in results["scenarios"].items():
+        latency = result["latency_ms"]
+        db_commands = result["db_commands_per_request"]
+        print(
+            f"{name:<16}{result['throughput_rps']:>9.1f}{latency['p50']:>10.1f}{latency['p95']:>10.1f}"
+            f"{latency['p99']:>10.1f}{'-' if db_commands is None else db_commands:>8}{result['errors']:>8}",
+            end=""
+        )
+        previous = (baseline or {}).get("scenarios", {}).get(name)
+        if previous:
+            change = (latency["p95"] - previous["latency_ms"]["p95"]) / previous["latency_ms"]["p95"] * 100
+            print(f"{change:>+12.1f}%")
+        else:
+            print(f"{'-':>13}" if baseline else "")
+
+async def benchmark(server, args):
+    rng = random.Random(args.seed)
+    async with server.lifespan(server.app):
+        seed_started_at = time.perf_counter()
+        school, counts = await seed_school(server, args.school, args.grade_fill, rng)
+        seed_seconds = time.perf_counter() - seed_started_at
+        print(f"Seeded {counts} in {seed_seconds:.1f}s")
+
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as http:
+            scenarios = {}
+            for name in args.scenarios:
+                print(f"Running {name} ({args.requests} requests, concurrency {args.concurrency})")
+                scenarios[name] = await run_scenario(server, http, name, school, args, rng)
+
+    return {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat() + "Z",
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": "mongomock" if args.mock else "mongodb",
+            "size": args.size,
+            "school": args.school,
+            "grade_fill": args.grade_fill,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "import_rows": args.import_rows,
+            "seed": args.seed
+        },
+        "seeded": {**counts, "seconds": round(seed_seconds, 3)},
+        "scenarios": scenarios
+    }
+
+def main():
+    args = parse_args()
+    server = load_server(args)
+    results = asyncio.run(benchmark(server, args))
+
+    output = Path(args.output) if args.output else (
+        ROOT_DIR / "benchmark_results" / f"{datetime.utcnow():%Y%m%dT%H%M%S}_{results['meta']['commit'] or 'nocommit'}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+    print_results(results, baseline)
+    print(f"Results saved to {output}")
+    return 1 if any(result["errors"] for result in results["scenarios"].values()) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
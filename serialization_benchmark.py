@@ -0,0 +1,95 @@
+"""Compare the cost of serializing list responses, per 1,000 rows.
+
+"model" is the previous read path: build a Pydantic model per document,
+validate the list again against the response model and encode it with
+jsonable_encoder + json.dumps, as FastAPI does for a response_model route.
+"lean" is the current path: the raw documents passed to orjson.
+
+Runs without a database: the server opens its client only on startup.
+"""
+import sys
+import json
+import timeit
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from server import LearningObjective, Student, Subject
+
+ROWS = 1000
+REPEAT = 5
+NUMBER = 20
+
+def student_documents(count):
+    now = datetime.utcnow()
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "nama": f"Siswa Nomor {i}",
+            "nis": f"N{i:06d}",
+            "kelas": f"X{i % 12 + 1}",
+            "jenis_kelamin": "Laki-laki" if i % 2 else "Perempuan",
+            "status": "Aktif",
+            "created_at": now,
+            "updated_at": now
+        }
+        for i in range(count)
+    ]
+
+def subject_documents(count):
+    now = datetime.utcnow()
+    return [
+        {"id": str(uuid.uuid4()), "nama_mata_pelajaran": f"Mata Pelajaran {i}", "created_at": now, "updated_at": now}
+        for i in range(count)
+    ]
+
+def objective_documents(count):
+    now = datetime.utcnow()
+    return [
+        {"id": str(uuid.uuid4()), "tujuan_pembelajaran": f"Tujuan pembelajaran nomor {i}", "created_at": now, "updated_at": now}
+        for i in range(count)
+    ]
+
+def model_path(model, adapter):
+    def serialize(documents):
+        items = [model(**{k: v for k, v in document.items() if k != "_id"}) for document in documents]
+        validated = adapter.validate_python([item.model_dump() for item in items])
+        return json.dumps(jsonable_encoder(validated)).encode()
+    return serialize
+
+def lean_path(documents):
+    return orjson.dumps(documents)
+
+def best_ms(function, documents):
+    timings = timeit.repeat(lambda: function(documents), repeat=REPEAT, number=NUMBER)
+    return min(timings) / NUMBER * 1000
+
+def main():
+    cases = [
+        ("students", Student, student_documents(ROWS)),
+        ("subjects", Subject, subject_documents(ROWS)),
+        ("learning_objectives", LearningObjective, objective_documents(ROWS)),
+    ]
+
+    print(f"Serialization cost per {ROWS} rows (best of {REPEAT} x {NUMBER} runs)")
+    print(f"{'collection':<22}{'model ms':>10}{'lean ms':>10}{'speedup':>10}")
+    for name, model, documents in cases:
+        model_serialize = model_path(model, TypeAdapter(List[model]))
+
+        # Both paths must produce the same JSON
+        assert json.loads(model_serialize(documents)) == json.loads(lean_path(documents))
+
+        model_ms = best_ms(model_serialize, documents)
+        lean_ms = best_ms(lean_path, documents)
+        print(f"{name:<22}{model_ms:>10.2f}{lean_ms:>10.2f}{model_ms / lean_ms:>9.1f}x")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""Shared fixtures: the app runs in-process against mongomock-motor.
+
+The server reads its settings and binds AsyncIOMotorClient at import time, so
+the environment and the client class are set up before it is imported.
+"""
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+import motor.motor_asyncio
+
+TEST_DIR = Path(tempfile.mkdtemp(prefix="penilaian_tests_"))
+os.environ["MONGO_URL"] = "mongodb://localhost:27017"
+os.environ["DB_NAME"] = "penilaian_test"
+os.environ["EXPORT_CACHE_DIR"] = str(TEST_DIR / "exports")
+os.environ["JOB_DIR"] = str(TEST_DIR / "jobs")
+os.environ["GRADE_CLEANUP_PAUSE_SECONDS"] = "0"
+motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import server  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+@pytest.fixture
+def client():
+    with TestClient(server.app) as test_client:
+        yield test_client
+        test_client.portal.call(server.client.drop_database, os.environ["DB_NAME"])
+    server.reference_cache.clear()
+    server.dashboard_cache.clear()
+    for path in server.export_cache.directory.iterdir():
+        path.unlink()
+
+def call(client, function, *args, **kwargs):
+    """Run a server coroutine on the app's event loop."""
+    return client.portal.call(lambda: function(*args, **kwargs))
+
+def wait_for_jobs(client, timeout=10):
+    deadline = time.monotonic() + timeout
+    while call(client, server.db.jobs.count_documents, {"status": {"$ne": "completed"}}):
+        if time.monotonic() > deadline:
+            raise AssertionError("Job belum selesai")
+        time.sleep(0.05)
+
+def create_class(client, kelas="X1", student_count=4, subject_count=2, objective_count=2):
+    """Create students, subjects and objectives, all objectives configured for every subject."""
+    student_ids = []
+    for number in range(student_count):
+        response = client.post("/api/students", json={
+            "nama": f"Siswa {kelas} {number}", "nis": f"{kelas}{number:03d}",
+            "kelas": kelas, "jenis_kelamin": "Laki-laki"
+        })
+        assert response.status_code == 200, response.text
+        student_ids.append(response.json()["id"])
+    subject_ids = [
+        client.post("/api/subjects", json={"nama_mata_pelajaran": f"Mapel {kelas} {number}"}).json()["id"]
+        for number in range(subject_count)
+    ]
+    objective_ids = [
+        client.post("/api/learning-objectives", json={"tujuan_pembelajaran": f"Tujuan {kelas} {number}"}).json()["id"]
+        for number in range(objective_count)
+    ]
+    for subject_id in subject_ids:
+        response = client.post("/api/subject-class-objectives", json={
+            "subject_id": subject_id, "kelas": kelas, "learning_objective_ids": objective_ids
+        })
+        assert response.status_code == 200, response.text
+    return student_ids, subject_ids, objective_ids
+
+def save_grade(client, student_id, subject_id, objective_id, nilai, kelas="X1"):
+    response = client.post("/api/grades", json={
+        "student_id": student_id, "subject_id": subject_id, "kelas": kelas,
+        "learning_objective_id": objective_id, "nilai": nilai
+    })
+    assert response.status_code == 200, response.text
@@ -0,0 +1,44 @@
+"""Cached class exports are reused until the class's data changes."""
+import server
+from tests.conftest import call, create_class, save_grade
+
+def export_csv(client, kelas="X1"):
+    return client.get(f"/api/reports/grades/{kelas}/export", params={"format": "csv"})
+
+def test_export_is_cached_until_a_grade_changes(client):
+    student_ids, subject_ids, objective_ids = create_class(client)
+    save_grade(client, student_ids[0], subject_ids[0], objective_ids[0], 80)
+
+    first = export_csv(client)
+    assert first.status_code == 200
+    hits = server.export_cache.hits
+    assert export_csv(client).content == first.content
+    assert server.export_cache.hits == hits + 1
+
+    save_grade(client, student_ids[0], subject_ids[0], objective_ids[0], 65)
+    changed = export_csv(client)
+    assert changed.status_code == 200
+    assert "65" in changed.text and "80" not in changed.text
+
+def test_subject_rename_invalidates_export(client):
+    student_ids, subject_ids, objective_ids = create_class(client, subject_count=1)
+    save_grade(client, student_ids[0], subject_ids[0], objective_ids[0], 80)
+    assert "Mapel X1 0" in export_csv(client).text
+
+    response = client.put(f"/api/subjects/{subject_ids[0]}", json={"nama_mata_pelajaran": "Diganti"})
+    assert response.status_code == 200, response.text
+    assert "Diganti" in export_csv(client).text
+
+def test_delete_all_students_invalidates_export_without_version_counter(client):
+    response = client.post("/api/students", json={"nama": "Lama", "nis": "9", "kelas": "X9", "jenis_kelamin": "Laki-laki"})
+    assert response.status_code == 200
+    # A class written before data versions existed has no counter
+    call(client, server.db.data_versions.delete_many, {"_id": server.class_version_key("X9")})
+
+    first = export_csv(client, "X9")
+    assert first.status_code == 200
+    assert "Lama" in first.text
+
+    assert client.delete("/api/students").status_code == 200
+    assert export_csv(client, "X9").status_code == 404
+    assert client.get("/api/reports/grades/X9/matrix").status_code == 404
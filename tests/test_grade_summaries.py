@@ -0,0 +1,134 @@
+"""The incremental grade summaries must always equal a rebuild from the grades."""
+import asyncio
+
+import server
+from tests.conftest import call, create_class, save_grade, wait_for_jobs
+
+async def read_summaries():
+    students = {
+        (summary["kelas"], summary["student_id"]): (summary["total"], summary["count"])
+        async for summary in server.db.grade_summaries.find({})
+        if summary["count"]
+    }
+    classes = {
+        summary["kelas"]: (summary["total"], summary["count"])
+        async for summary in server.db.class_grade_summaries.find({})
+        if summary["count"]
+    }
+    return students, classes
+
+def assert_summaries_match_rebuild(client):
+    incremental = call(client, read_summaries)
+    call(client, server.rebuild_grade_summaries)
+    assert incremental == call(client, read_summaries)
+
+def fill_grades(client, student_ids, subject_ids, objective_ids, kelas="X1"):
+    nilai = 50
+    for student_id in student_ids[:-1]:
+        for subject_id in subject_ids:
+            for objective_id in objective_ids:
+                nilai += 1
+                save_grade(client, student_id, subject_id, objective_id, nilai, kelas)
+
+def test_single_grade_saves(client):
+    student_ids, subject_ids, objective_ids = create_class(client)
+    fill_grades(client, student_ids, subject_ids, objective_ids)
+    assert_summaries_match_rebuild(client)
+
+    # Overwriting a grade moves the totals by the difference only
+    save_grade(client, student_ids[0], subject_ids[0], objective_ids[0], 10)
+    save_grade(client, student_ids[0], subject_ids[0], objective_ids[0], 17.25)
+    assert_summaries_match_rebuild(client)
+
+    averages = client.get("/api/reports/averages/X1").json()
+    report = {row["student"]["id"]: row["average"] for row in client.get("/api/reports/grades/X1").json()}
+    for student in averages["students"]:
+        if student["grade_count"]:
+            assert student["average"] == report[student["student_id"]]
+
+def test_grade_sheet_saves(client):
+    student_ids, subject_ids, objective_ids = create_class(client)
+    fill_grades(client, student_ids, subject_ids, objective_ids)
+    sheet = {
+        "subject_id": subject_ids[1], "kelas": "X1", "learning_objective_id": objective_ids[1],
+        "grades": [
+            {"student_id": student_ids[3], "nilai": 90},
+            {"student_id": student_ids[1], "nilai": 20},
+            {"student_id": student_ids[3], "nilai": 95}
+        ]
+    }
+    for _ in range(2):
+        response = client.post("/api/grades/bulk", json=sheet)
+        assert response.status_code == 200, response.text
+        assert response.json()["error_count"] == 0
+        assert_summaries_match_rebuild(client)
+
+def test_grade_sheet_for_unconfigured_objective(client):
+    student_ids, subject_ids, objective_ids = create_class(client)
+    fill_grades(client, student_ids, subject_ids, objective_ids)
+    extra = client.post("/api/learning-objectives", json={"tujuan_pembelajaran": "Belum dipakai"}).json()["id"]
+    response = client.post("/api/grades/bulk", json={
+        "subject_id": subject_ids[0], "kelas": "X1", "learning_objective_id": extra,
+        "grades": [{"student_id": student_id, "nilai": 100} for student_id in student_ids]
+    })
+    assert response.status_code == 200, response.text
+    assert_summaries_match_rebuild(client)
+
+def test_subject_class_objective_edits(client):
+    student_ids, subject_ids, objective_ids = create_class(client, subject_count=3, objective_count=3)
+    fill_grades(client, student_ids, subject_ids, objective_ids)
+    scos = {sco["subject"]["id"]: sco["id"] for sco in client.get("/api/subject-class-objectives").json()}
+
+    response = client.put(f"/api/subject-class-objectives/{scos[subject_ids[0]]}", json={
+        "subject_id": subject_ids[0], "kelas": "X1", "learning_objective_ids": [objective_ids[0]]
+    })
+    assert response.status_code == 200, response.text
+    assert_summaries_match_rebuild(client)
+
+    assert client.delete(f"/api/subject-class-objectives/{scos[subject_ids[1]]}").status_code == 200
+    assert_summaries_match_rebuild(client)
+
+    response = client.post("/api/subject-class-objectives", json={
+        "subject_id": subject_ids[1], "kelas": "X1", "learning_objective_ids": objective_ids
+    })
+    assert response.status_code == 200, response.text
+    assert_summaries_match_rebuild(client)
+
+def test_cascading_deletes(client):
+    student_ids, subject_ids, objective_ids = create_class(client, subject_count=3, objective_count=3)
+    fill_grades(client, student_ids, subject_ids, objective_ids)
+
+    assert client.delete(f"/api/students/{student_ids[1]}").status_code == 200
+    assert_summaries_match_rebuild(client)
+    assert client.delete(f"/api/subjects/{subject_ids[2]}").status_code == 200
+    assert_summaries_match_rebuild(client)
+    assert client.delete(f"/api/learning-objectives/{objective_ids[1]}").status_code == 200
+    assert_summaries_match_rebuild(client)
+
+    wait_for_jobs(client)
+    assert_summaries_match_rebuild(client)
+    assert client.delete("/api/students").status_code == 200
+    assert call(client, read_summaries) == ({}, {})
+
+async def stop_job_workers():
+    for task in server.job_worker_tasks:
+        task.cancel()
+    await asyncio.gather(*server.job_worker_tasks, return_exceptions=True)
+    server.job_worker_tasks.clear()
+
+def test_deleted_grades_are_hidden_until_cleanup_deletes_them(client):
+    student_ids, subject_ids, objective_ids = create_class(client)
+    fill_grades(client, student_ids, subject_ids, objective_ids)
+
+    # Keep the cleanup queued so the grades are still stored
+    call(client, stop_job_workers)
+    assert client.delete(f"/api/learning-objectives/{objective_ids[0]}").status_code == 200
+    assert call(client, server.db.grades.count_documents, {"learning_objective_id": objective_ids[0]}) > 0
+
+    sheet = client.get(f"/api/grades/{subject_ids[0]}/X1/{objective_ids[0]}").json()
+    assert [row["grade"] for row in sheet] == [None] * len(student_ids)
+    assert_summaries_match_rebuild(client)
+
+    call(client, server.start_job_workers)
+    wait_for_jobs(client)
+    assert call(client, server.db.grades.count_documents, {"learning_objective_id": objective_ids[0]}) == 0
@@ -0,0 +1,47 @@
+"""Keyset pages and student search."""
+
+def create_student(client, nama, nis, kelas="X1"):
+    response = client.post("/api/students", json={"nama": nama, "nis": nis, "kelas": kelas, "jenis_kelamin": "Perempuan"})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def test_pages_cover_every_student_once_in_name_order(client):
+    # Equal names force the id tie-breaker in the cursor
+    for number in range(7):
+        create_student(client, f"Siswa {number % 3}", f"N{number}")
+
+    seen = []
+    params = {"limit": 3}
+    while True:
+        page = client.get("/api/students", params=params).json()
+        seen.extend(page["items"])
+        if not page["next_cursor"]:
+            break
+        params["cursor"] = page["next_cursor"]
+
+    assert len(seen) == 7
+    assert len({student["id"] for student in seen}) == 7
+    assert [(student["nama"], student["id"]) for student in seen] == sorted((student["nama"], student["id"]) for student in seen)
+    assert all("search_tokens" not in student for student in seen)
+
+def test_invalid_cursor_is_rejected(client):
+    assert client.get("/api/students", params={"cursor": "bukan-cursor"}).status_code == 400
+
+def test_search_matches_word_prefixes_without_diacritics(client):
+    jose = create_student(client, "José Ramírez", "A1")
+    create_student(client, "Budi Santoso", "B1")
+
+    found = client.get("/api/students", params={"search": "jose ram"}).json()
+    assert [student["id"] for student in found] == [jose["id"]]
+    assert client.get("/api/students", params={"search": "mirez"}).json() == []
+
+    # Renaming updates the stored tokens
+    response = client.put(f"/api/students/{jose['id']}", json={"nama": "Joko Widodo"})
+    assert response.status_code == 200, response.text
+    assert client.get("/api/students", params={"search": "jose"}).json() == []
+    assert [student["id"] for student in client.get("/api/students", params={"search": "wido"}).json()] == [jose["id"]]
+
+def test_search_by_nis_prefix(client):
+    student = create_student(client, "Citra", "X1-0042")
+    found = client.get("/api/students", params={"search": "x1-00"}).json()
+    assert [item["id"] for item in found] == [student["id"]]
@@ -0,0 +1,67 @@
+"""The class report, the grade matrix and the exports agree on every average."""
+import random
+
+import numpy as np
+
+import server
+from tests.conftest import create_class, save_grade
+
+def test_report_and_matrix_averages_agree(client):
+    student_ids, subject_ids, objective_ids = create_class(client, student_count=2)
+    save_grade(client, student_ids[0], subject_ids[0], objective_ids[0], 17.25)
+    save_grade(client, student_ids[0], subject_ids[0], objective_ids[1], 72.1)
+
+    report = {row["student"]["id"]: row["average"] for row in client.get("/api/reports/grades/X1").json()}
+    matrix = client.get("/api/reports/grades/X1/matrix").json()
+    averages = dict(zip(matrix["students"]["id"], matrix["student_averages"]))
+    assert report[student_ids[0]] == averages[student_ids[0]] == 44.67
+    assert averages[student_ids[1]] is None
+
+    exported = client.get("/api/reports/grades/X1/export", params={"format": "csv"}).text
+    assert "44.67" in exported
+
+def test_report_and_matrix_averages_agree_on_random_grades():
+    rng = random.Random(20)
+    students = [
+        {"id": f"s{number}", "nama": f"Siswa {number}", "nis": str(number), "kelas": "X1", "jenis_kelamin": "Laki-laki"}
+        for number in range(300)
+    ]
+    # Subject names sort in the opposite order of the SCOs, so the matrix
+    # adds each student's grades in a different order from the report
+    scos = [
+        {"subject_id": "a", "kelas": "X1", "learning_objective_ids": ["o1", "o2", "o3"]},
+        {"subject_id": "b", "kelas": "X1", "learning_objective_ids": ["o1", "o4"]}
+    ]
+    subjects = {"a": {"nama_mata_pelajaran": "Zoologi"}, "b": {"nama_mata_pelajaran": "Aljabar"}}
+    objectives = {obj_id: {"tujuan_pembelajaran": obj_id} for obj_id in ["o1", "o2", "o3", "o4"]}
+    grades = [
+        {"student_id": student["id"], "subject_id": sco["subject_id"], "kelas": "X1",
+         "learning_objective_id": obj_id, "nilai": round(rng.uniform(0, 100), rng.choice([0, 1, 2]))}
+        for student in students
+        for sco in scos
+        for obj_id in sco["learning_objective_ids"]
+        if rng.random() < 0.8
+    ]
+
+    report = server.build_class_grade_report(students, scos, subjects, objectives, grades)
+    matrix = server.build_class_grade_matrix("X1", students, scos, subjects, objectives, grades)
+    for row, average in zip(report, matrix["student_averages"]):
+        assert (average or 0) == row["average"]
+
+def test_matrix_column_std_uses_the_unrounded_mean():
+    students = [
+        {"id": f"s{number}", "nama": f"Siswa {number}", "nis": str(number), "kelas": "X1", "jenis_kelamin": "Laki-laki"}
+        for number in range(2)
+    ]
+    scos = [{"subject_id": "a", "kelas": "X1", "learning_objective_ids": ["o1"]}]
+    # The spread is far smaller than the rounding of the mean
+    values = [10.004, 10.006]
+    grades = [
+        {"student_id": student["id"], "subject_id": "a", "kelas": "X1", "learning_objective_id": "o1", "nilai": nilai}
+        for student, nilai in zip(students, values)
+    ]
+
+    matrix = server.build_class_grade_matrix(
+        "X1", students, scos, {"a": {"nama_mata_pelajaran": "A"}}, {"o1": {"tujuan_pembelajaran": "o1"}}, grades
+    )
+    assert matrix["column_stats"]["std"] == [round(float(np.std(values)), 2)] == [0.0]